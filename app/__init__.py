@@ -1,18 +1,62 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import event, inspect
+from sqlalchemy.schema import CreateColumn
+from .branches import branch_engines, current_branch, branch_codes
+from .routing import RoutingSession, init_read_replicas
+from .panels import PANELS, register_panels
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
     app.config['SECRET_KEY'] = 'bardzo_tajny_klucz_do_sesji'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///warsztat.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Oddziały: {'kod': 'uri bazy'} - każdy oddział ma własną bazę (pusty słownik = jedna baza)
+    app.config['WORKSHOP_BRANCHES'] = {}
+    # Odczyty: {kod oddziału lub None: uri repliki}; SQLITE_WAL_READS czyta z plików SQLite przez osobną pulę
+    app.config['READ_REPLICAS'] = {}
+    app.config['SQLITE_WAL_READS'] = False
+    app.config['READ_YOUR_WRITES_SECONDS'] = 5
+    # Szybki start: bez sprawdzania schematu wszystkich baz przy każdym uruchomieniu (create_all, kolumny, indeksy,
+    # bilans otwarcia). Schemat aktualizuje wtedy `flask init-db` przy wdrożeniu; włączony w asgi.py dla workerów,
+    # wyłączony domyślnie, żeby `flask run` na nowej bazie działał od razu. Zysk: python -m benchmarks.startup
+    app.config['FAST_START'] = False
+    app.config['PANELS'] = PANELS
+    # Powiadomienia o statusie wysyła worker `flask notifier` - żądanie tylko zapisuje je w outboxie
+    app.config['NOTIFY_CHANNELS'] = ('email',)
+    app.config['SMTP_HOST'] = 'localhost'
+    app.config['SMTP_PORT'] = 1025
+    app.config['MAIL_SENDER'] = 'warsztat@localhost'
+    app.config['SMS_GATEWAY_URL'] = None
+    # Kompresja odpowiedzi tekstowych od tego rozmiaru (bajty) i czas cache plików statycznych (s)
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['STATIC_MAX_AGE'] = 7 * 24 * 3600
+    # Kopie zapasowe (`flask backup`): katalog, ile kopii trzymać i tempo kopiowania (stron na krok, przerwa w s)
+    app.config['BACKUP_DIR'] = os.path.join(app.instance_path, 'backups')
+    app.config['BACKUP_KEEP'] = 14
+    app.config['BACKUP_PAGES'] = 256
+    app.config['BACKUP_SLEEP'] = 0.005
+    # Przypomnienia o terminach usług (`flask remind-due`): ile dni wcześniej i adres do linku rezerwacji
+    app.config['REMINDER_LEAD_DAYS'] = 14
+    app.config['PUBLIC_URL'] = 'http://localhost:5000'
+    # Snapshot kolumnowy dla analityki właściciela (`flask analytics-snapshot`) - widok nie czyta tabel zleceń
+    app.config['ANALYTICS_DIR'] = os.path.join(app.instance_path, 'analytics')
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **app.config['WORKSHOP_BRANCHES']}
     db.init_app(app)
+    # Oddziały mają te same modele co baza główna - nie potrzebują własnego MetaData
+    for code in app.config['WORKSHOP_BRANCHES']:
+        db.metadatas.pop(code, None)
     login_manager.init_app(app)
 
     login_manager.login_view = 'main.login'
@@ -23,12 +67,90 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Sesja należy do oddziału, w którym konto się zalogowało - inny oddział to inny użytkownik
+        branch, _, user_id = user_id.rpartition(':')
+        if (branch or None) != current_branch():
+            return None
+        user = User.query.get(int(user_id))
+        if user is not None:
+            user.branch = branch or None
+        return user
+
+    @app.context_processor
+    def inject_branches():
+        return {'branches': branch_codes(), 'current_branch': current_branch()}
 
     from . import routes
     app.register_blueprint(routes.bp)
+    register_panels(app, app.config['PANELS'])
+
+    from .http_cache import init_response_layer
+    init_response_layer(app)
+
+    if not event.contains(RoutingSession, 'before_flush', run_flush_hooks):
+        event.listen(RoutingSession, 'before_flush', run_flush_hooks)
+
+    from .commands import (init_db_command, forecast_parts_command, notifier_command, stock_snapshot_command,
+                           backup_command, restore_backup_command, remind_due_command,
+                           analytics_snapshot_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(forecast_parts_command)
+    app.cli.add_command(notifier_command)
+    app.cli.add_command(stock_snapshot_command)
+    app.cli.add_command(backup_command)
+    app.cli.add_command(restore_backup_command)
+    app.cli.add_command(remind_due_command)
+    app.cli.add_command(analytics_snapshot_command)
 
     with app.app_context():
-        db.create_all()
+        if not app.config['FAST_START']:
+            create_schema()
+        init_read_replicas(app, db)
+
+    return app
+
+
+def run_flush_hooks(session, flush_context, instances):
+    # Księga magazynu i terminy usług ładowane przy pierwszym zapisie, nie przy starcie aplikacji
+    from .stock import keep_ledger
+    from .reminders import track_completions
+
+    keep_ledger(session, flush_context, instances)
+    track_completions(session, flush_context, instances)
+
+
+def create_schema():
+    for engine in {db.engine, *branch_engines().values()}:
+        db.metadata.create_all(engine)
+        upgrade_schema(engine)
+
+
+def upgrade_schema(engine):
+    """Dodaje do istniejącej bazy kolumny i indeksy, których brakuje względem modeli."""
+    from .models import backfill_opening_balances, backfill_price_snapshots, backfill_reminder_days
+
+    inspector = inspect(engine)
+    added = set()
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = str(CreateColumn(column).compile(dialect=engine.dialect))
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                connection.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+                added.add(f"{table.name}.{column.name}")
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
 
-    return app
\ No newline at end of file
+        if 'repair_order.grand_total' in added:
+            backfill_price_snapshots(connection)
+        if 'service.reminder_days' in added:
+            backfill_reminder_days(connection)
+        backfill_opening_balances(connection)
@@ -0,0 +1,149 @@
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import RepairOrder, RepairService, User, Vehicle
+
+TREND_MONTHS = 12
+UNASSIGNED = 'Nieprzypisany'
+
+# Kolumny zlecenia (jeden wiersz na zakończone zlecenie) i pozycji usług (wiersz na usługę w zleceniu)
+ORDER_COLUMNS = ('order_id', 'end_date', 'hours', 'revenue', 'parts', 'services', 'mechanic', 'model')
+LINE_COLUMNS = ('line_order', 'line_service', 'line_price')
+CATEGORIES = ('mechanic', 'model', 'line_service')
+
+_loaded = {}
+
+
+def encode(values):
+    """Kolumna kategorii jako kody int32 + etykiety - grupowanie liczy na liczbach, nie na napisach."""
+    labels, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), labels
+
+
+def build_snapshot(session=None, now=None):
+    """Kolumny zakończonych zleceń i ich usług - jeden odczyt tabel na cały snapshot."""
+    session = session or db.session
+    finished = (RepairOrder.status == 'Gotowe', RepairOrder.end_date.is_not(None))
+    orders = session.execute(
+        select(RepairOrder.id, RepairOrder.start_date, RepairOrder.end_date, RepairOrder.grand_total,
+               RepairOrder.parts_total, RepairOrder.services_total, Vehicle.make, Vehicle.model,
+               User.first_name, User.last_name)
+        .join(Vehicle, Vehicle.id == RepairOrder.vehicle_id)
+        .outerjoin(User, User.id == RepairOrder.mechanic_id)
+        .where(*finished).order_by(RepairOrder.id)
+    ).all()
+    lines = session.execute(
+        select(RepairService.repair_id, RepairService.name, RepairService.price)
+        .join(RepairOrder, RepairOrder.id == RepairService.repair_id).where(*finished)
+    ).all()
+
+    order_id = np.array([row[0] for row in orders], dtype=np.int64)
+    start = np.array([row[1] for row in orders], dtype='datetime64[s]')
+    end = np.array([row[2] for row in orders], dtype='datetime64[s]')
+    snapshot = {
+        'order_id': order_id,
+        'end_date': end,
+        'hours': (end - start).astype(np.float64) / 3600,
+        'revenue': np.array([row[3] for row in orders], dtype=np.float64),
+        'parts': np.array([row[4] for row in orders], dtype=np.float64),
+        'services': np.array([row[5] for row in orders], dtype=np.float64),
+        # Pozycja usługi wskazuje wiersz swojego zlecenia w kolumnach powyżej
+        'line_order': np.searchsorted(order_id, np.array([row[0] for row in lines], dtype=np.int64)),
+        'line_price': np.array([row[2] for row in lines], dtype=np.float64),
+        'taken_at': np.datetime64(now or datetime.now(), 's'),
+    }
+    snapshot['mechanic'], snapshot['mechanic_labels'] = encode(
+        [f"{row[8]} {row[9]}" if row[8] else UNASSIGNED for row in orders])
+    snapshot['model'], snapshot['model_labels'] = encode([f"{row[6]} {row[7]}" for row in orders])
+    snapshot['line_service'], snapshot['line_service_labels'] = encode([row[1] for row in lines])
+    return snapshot
+
+
+def snapshot_path(code=None):
+    return Path(current_app.config['ANALYTICS_DIR']) / f"{code or 'main'}.npz"
+
+
+def save_snapshot(snapshot, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+    with open(partial, 'wb') as file:
+        np.savez(file, **snapshot)
+    # Widok nigdy nie czyta pliku w połowie zapisu
+    partial.replace(path)
+
+
+def load_snapshot(path):
+    """Snapshot z pliku; trzymany w pamięci, dopóki job nie zapisze nowszego."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    mtime = path.stat().st_mtime_ns
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        with np.load(path) as data:
+            cached = _loaded[path] = (mtime, {name: data[name] for name in data.files})
+    return cached[1]
+
+
+def combine(snapshots):
+    """Łączy snapshoty oddziałów: etykiety kategorii ujednolicone, pozycje usług przesunięte o zlecenia."""
+    if len(snapshots) == 1:
+        return snapshots[0]
+    combined = {name: np.concatenate([s[name] for s in snapshots]) for name in ORDER_COLUMNS + LINE_COLUMNS}
+    offsets = np.cumsum([0] + [len(s['order_id']) for s in snapshots[:-1]])
+    combined['line_order'] = np.concatenate([s['line_order'] + offset for s, offset in zip(snapshots, offsets)])
+    for name in CATEGORIES:
+        labels = np.unique(np.concatenate([s[f'{name}_labels'] for s in snapshots]))
+        combined[name] = np.concatenate([np.searchsorted(labels, s[f'{name}_labels'])[s[name]].astype(np.int32)
+                                         for s in snapshots])
+        combined[f'{name}_labels'] = labels
+    combined['taken_at'] = min(s['taken_at'] for s in snapshots)
+    return combined
+
+
+def group_by(codes, labels, hours, revenue):
+    """Liczba zleceń, przychód, godziny i średni czas realizacji na kategorię (bincount zamiast pętli)."""
+    size = len(labels)
+    orders = np.bincount(codes, minlength=size)
+    total_hours = np.bincount(codes, weights=hours, minlength=size)
+    total_revenue = np.bincount(codes, weights=revenue, minlength=size)
+    return [{'label': str(labels[i]), 'orders': int(orders[i]), 'revenue': float(total_revenue[i]),
+             'hours': float(total_hours[i]), 'avg_hours': float(total_hours[i] / orders[i])}
+            for i in np.argsort(-total_revenue, kind='stable') if orders[i]]
+
+
+def monthly_trend(snapshot, months=TREND_MONTHS):
+    month = snapshot['end_date'].astype('datetime64[M]')
+    periods, codes = np.unique(month, return_inverse=True)
+    rows = group_by(codes, periods.astype(str), snapshot['hours'], snapshot['revenue'])
+    return sorted(rows, key=lambda row: row['label'])[-months:]
+
+
+def summarize(snapshot):
+    """Wszystkie zestawienia widoku analityki z jednego snapshotu."""
+    hours, revenue = snapshot['hours'], snapshot['revenue']
+    count = len(snapshot['order_id'])
+    return {
+        'taken_at': snapshot['taken_at'].item(),
+        'orders': count,
+        'revenue': float(revenue.sum()),
+        'avg_hours': float(hours.mean()) if count else 0.0,
+        'by_mechanic': group_by(snapshot['mechanic'], snapshot['mechanic_labels'], hours, revenue),
+        'by_model': group_by(snapshot['model'], snapshot['model_labels'], hours, revenue),
+        # Usługa liczy czas całego zlecenia, w którym wystąpiła, i swoją cenę z chwili naprawy
+        'by_service': group_by(snapshot['line_service'], snapshot['line_service_labels'],
+                               hours[snapshot['line_order']], snapshot['line_price']),
+        'trend': monthly_trend(snapshot),
+    }
+
+
+def refresh_snapshot(code=None, now=None):
+    snapshot = build_snapshot(now=now)
+    save_snapshot(snapshot, snapshot_path(code))
+    return len(snapshot['order_id'])
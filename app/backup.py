@@ -0,0 +1,154 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+BACKUP_SUFFIX = '.db'
+STAMP_FORMAT = '%Y%m%d-%H%M%S'
+MAX_RESTARTS = 3  # zapis innego połączenia w trakcie kopiowania zaczyna kopię od nowa
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def database_path(engine):
+    """Plik bazy SQLite dla silnika - kopie zapasowe obsługują tylko bazy plikowe."""
+    database = engine.url.database
+    if engine.url.get_backend_name() != 'sqlite' or database in (None, '', ':memory:'):
+        raise BackupError(f"Kopia zapasowa wymaga pliku SQLite, a nie {engine.url.get_backend_name()}")
+    return Path(database)
+
+
+def workshop_databases():
+    """Bazy do kopiowania: {prefiks nazwy kopii: silnik} - baza główna i bazy oddziałów."""
+    from . import db
+    from .branches import branch_engines
+
+    branches = {code: engine for code, engine in branch_engines().items() if code is not None}
+    try:
+        databases = {database_path(db.engine).stem: db.engine}
+    except BackupError:
+        # Przy oddziałach baza główna może nie być plikiem SQLite - kopiujemy wtedy same oddziały
+        if not branches:
+            raise
+        databases = {}
+    for code, engine in branches.items():
+        database_path(engine)
+        databases[code] = engine
+    return databases
+
+
+def integrity_ok(path):
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return connection.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    except sqlite3.DatabaseError:  # uszkodzony nagłówek lub to w ogóle nie jest plik SQLite
+        return False
+    finally:
+        connection.close()
+
+
+def copy_online(source_path, target_path, pages, sleep):
+    """Kopia przez backup API SQLite: po `pages` stron naraz z przerwą `sleep`, żeby zapisy nie czekały.
+
+    Jeśli zapisy ciągle restartują kopię, ostatnia próba kopiuje całość w jednym kroku (jedna krótka blokada).
+    W trybie WAL czytelnik nie blokuje zapisów, więc kopia od razu idzie w jednym kroku - bez restartów.
+    """
+    restarts = [0]
+    copied = [0]
+
+    def progress(status, remaining, total):
+        done = total - remaining
+        if done < copied[0]:
+            restarts[0] += 1
+            if restarts[0] > MAX_RESTARTS:
+                raise _Restarted()
+        copied[0] = done
+
+    source = sqlite3.connect(source_path)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            pages = -1
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=sleep)
+            except _Restarted:
+                source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return restarts[0]
+
+
+def backup_database(engine, target_dir, prefix, pages=256, sleep=0.005, now=None):
+    """Tworzy zweryfikowaną kopię bazy w target_dir i zwraca jej ścieżkę."""
+    source_path = database_path(engine)
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target_path = target_dir / f"{prefix}-{(now or datetime.now()).strftime(STAMP_FORMAT)}{BACKUP_SUFFIX}"
+    partial = target_path.with_name(target_path.name + '.part')
+
+    copy_online(source_path, partial, pages, sleep)
+    if not integrity_ok(partial):
+        partial.unlink()
+        raise BackupError(f"Kopia {target_path.name} nie przeszła PRAGMA integrity_check")
+    # Nazwa docelowa pojawia się dopiero dla kompletnej, sprawdzonej kopii
+    partial.replace(target_path)
+    return target_path
+
+
+def backup_time(path, prefix):
+    """Czas wykonania kopii z nazwy pliku albo None, jeśli to nie jest kopia tej bazy (np. 'krk-nowa-...')."""
+    stamp = path.name[len(prefix) + 1:-len(BACKUP_SUFFIX)]
+    try:
+        return datetime.strptime(stamp, STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def list_backups(target_dir, prefix):
+    """Kopie danej bazy od najnowszej."""
+    backups = [(backup_time(path, prefix), path) for path in Path(target_dir).glob(f"{prefix}-*{BACKUP_SUFFIX}")]
+    return [path for taken_at, path in sorted((b for b in backups if b[0] is not None), reverse=True)]
+
+
+def prune_backups(target_dir, prefix, keep):
+    removed = list_backups(target_dir, prefix)[keep:]
+    for path in removed:
+        path.unlink()
+    return removed
+
+
+def restore_database(engine, backup_path, target_dir, prefix):
+    """Przywraca bazę ze sprawdzonej kopii; bieżący stan zapisuje najpierw w katalogu 'przed-przywroceniem'."""
+    backup_path = Path(backup_path)
+    if not backup_path.is_file():
+        raise BackupError(f"Nie ma pliku {backup_path}")
+    if not integrity_ok(backup_path):
+        raise BackupError(f"Kopia {backup_path.name} nie przeszła PRAGMA integrity_check - nic nie zmieniono")
+
+    live_path = database_path(engine)
+    safety = None
+    if live_path.exists():
+        safety = backup_database(engine, Path(target_dir) / 'przed-przywroceniem', prefix)
+    engine.dispose()
+
+    source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    try:
+        target = sqlite3.connect(live_path)
+        try:
+            source.backup(target)
+            if target.execute('PRAGMA integrity_check').fetchone()[0] != 'ok':
+                raise BackupError("Przywrócona baza nie przeszła PRAGMA integrity_check")
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return safety
+
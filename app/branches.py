@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+
+def branch_codes():
+    """Kody oddziałów z konfiguracji WORKSHOP_BRANCHES (pusta lista = jedna baza)."""
+    return list(current_app.config.get('WORKSHOP_BRANCHES', {}))
+
+
+def current_branch():
+    if 'branch' in g:
+        return g.branch
+    if has_request_context():
+        return session.get('branch')
+    return None
+
+
+@contextmanager
+def use_branch(code):
+    """Kieruje db.session do bazy wskazanego oddziału (np. w zadaniach CLI)."""
+    from . import db
+
+    had_branch, previous = 'branch' in g, g.get('branch')
+    g.branch = code
+    try:
+        yield
+    finally:
+        db.session.remove()
+        # Bez wcześniejszego wyboru oddział znów pochodzi z sesji HTTP
+        if had_branch:
+            g.branch = previous
+        else:
+            g.pop('branch')
+
+
+def branch_engines():
+    from . import db
+
+    codes = branch_codes()
+    if not codes:
+        return {None: db.engine}
+    return {code: db.engines[code] for code in codes}
+
+
+def for_each_branch(query):
+    """Wykonuje query(connection) równolegle na bazie każdego oddziału, zwraca {kod: wynik}."""
+    engines = branch_engines()
+
+    def run(engine):
+        with engine.connect() as connection:
+            return query(connection)
+
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        results = pool.map(run, engines.values())
+        return dict(zip(engines, results))
+
+
+class BranchSession(Session):
+    # Te same modele w każdej bazie - oddział wybiera silnik, a nie __bind_key__ modelu
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            code = current_branch()
+            if code in self._db.engines:
+                return self._db.engines[code]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
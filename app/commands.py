@@ -0,0 +1,173 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Tworzy brakujące tabele i kolumny we wszystkich bazach (też oddziałów)."""
+    from . import create_schema
+
+    create_schema()
+    click.echo("Schemat bazy jest aktualny.")
+
+
+@click.command('forecast-parts')
+@with_appcontext
+def forecast_parts_command():
+    """Przelicza zużycie części i sugestie zamówień dla właściciela."""
+    # NumPy ładowany dopiero tutaj - start aplikacji go nie potrzebuje
+    from .branches import branch_codes, use_branch
+    from .forecast import refresh_forecast
+
+    for code in branch_codes() or [None]:
+        with use_branch(code):
+            forecasts = refresh_forecast()
+        to_order = sum(1 for f in forecasts if f['suggested_quantity'] > 0)
+        prefix = f"[{code}] " if code else ""
+        click.echo(f"{prefix}Przeliczono {len(forecasts)} części, do zamówienia: {to_order}.")
+
+
+@click.command('notifier')
+@click.option('--once', is_flag=True, help="Opróżnij outbox raz i zakończ.")
+@click.option('--interval', default=5.0, show_default=True, help="Przerwa między przebiegami (s).")
+@click.option('--batch-size', default=50, show_default=True)
+@with_appcontext
+def notifier_command(once, interval, batch_size):
+    """Wysyła powiadomienia z outboxu (e-mail/SMS) z ponawianiem przy błędach."""
+    import time
+
+    from flask import current_app
+    from .branches import branch_codes, use_branch
+    from .notifications import build_adapters, drain_outbox
+
+    adapters = build_adapters(current_app.config)
+    while True:
+        for code in branch_codes() or [None]:
+            with use_branch(code):
+                # Pełna paczka = prawdopodobnie jest więcej, od razu bierzemy następną
+                while True:
+                    sent, picked = drain_outbox(adapters, batch_size)
+                    if picked:
+                        prefix = f"[{code}] " if code else ""
+                        click.echo(f"{prefix}Wysłano {sent}/{picked} powiadomień.")
+                    if picked < batch_size:
+                        break
+        if once:
+            break
+        time.sleep(interval)
+
+
+@click.command('stock-snapshot')
+@with_appcontext
+def stock_snapshot_command():
+    """Zapisuje snapshot stanów magazynu (punkt startowy do liczenia bieżących stanów)."""
+    from .branches import branch_codes, use_branch
+    from .stock import take_snapshots
+
+    for code in branch_codes() or [None]:
+        with use_branch(code):
+            drift = take_snapshots()
+        prefix = f"[{code}] " if code else ""
+        click.echo(f"{prefix}Snapshot magazynu zapisany.")
+        for part_id, (counter, ledger) in drift.items():
+            click.echo(f"{prefix}Część #{part_id}: licznik {counter}, księga {ledger} - sprawdź magazyn.")
+
+
+@click.command('backup')
+@click.option('--interval', type=float, default=None, help="Powtarzaj co N sekund zamiast jednej kopii.")
+@with_appcontext
+def backup_command(interval):
+    """Kopia zapasowa wszystkich baz bez zatrzymywania aplikacji, ze sprawdzeniem i retencją."""
+    import time
+
+    from flask import current_app
+    from .backup import BackupError, backup_database, prune_backups, workshop_databases
+
+    config = current_app.config
+    while True:
+        try:
+            for prefix, engine in workshop_databases().items():
+                path = backup_database(engine, config['BACKUP_DIR'], prefix, config['BACKUP_PAGES'],
+                                       config['BACKUP_SLEEP'])
+                removed = prune_backups(config['BACKUP_DIR'], prefix, config['BACKUP_KEEP'])
+                click.echo(f"Zapisano {path.name}" + (f", usunięto starych: {len(removed)}." if removed else "."))
+        except BackupError as error:
+            if interval is None:
+                raise click.ClickException(str(error))
+            # Tryb ciągły: nieudana kopia nie zatrzymuje kolejnych prób
+            click.echo(f"Błąd kopii: {error}", err=True)
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
+@click.command('restore-backup')
+@click.argument('backup_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--database', 'prefix', default=None, help="Kod oddziału lub nazwa bazy (domyślnie baza główna).")
+@click.option('--yes', is_flag=True, help="Bez pytania o potwierdzenie.")
+@with_appcontext
+def restore_backup_command(backup_file, prefix, yes):
+    """Przywraca bazę ze sprawdzonej kopii; bieżący stan trafia do kopii 'przed-przywroceniem'."""
+    from flask import current_app
+    from .backup import BackupError, restore_database, workshop_databases
+
+    try:
+        databases = workshop_databases()
+    except BackupError as error:
+        raise click.ClickException(str(error))
+    prefix = prefix or next(iter(databases))
+    if prefix not in databases:
+        raise click.BadParameter(f"Nieznana baza '{prefix}'. Dostępne: {', '.join(databases)}",
+                                 param_hint='--database')
+    if not yes:
+        click.confirm(f"Nadpisać bazę '{prefix}' zawartością {backup_file}? Uruchomione procesy aplikacji "
+                      f"należy potem zrestartować.", abort=True)
+    try:
+        safety = restore_database(databases[prefix], backup_file, current_app.config['BACKUP_DIR'], prefix)
+    except BackupError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Przywrócono bazę '{prefix}'." + (f" Poprzedni stan: {safety}" if safety else ""))
+
+
+@click.command('remind-due')
+@click.option('--rebuild', is_flag=True, help="Najpierw przelicz terminy z całej historii zleceń.")
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@with_appcontext
+def remind_due_command(rebuild, batch_size):
+    """Kolejkuje przypomnienia o zbliżających się terminach usług (wysyła je `flask notifier`)."""
+    from . import db
+    from .branches import branch_codes, use_branch
+    from .reminders import queue_due_reminders, rebuild_service_due
+
+    for code in branch_codes() or [None]:
+        prefix = f"[{code}] " if code else ""
+        with use_branch(code):
+            if rebuild:
+                vehicles = rebuild_service_due()
+                db.session.commit()
+                click.echo(f"{prefix}Przeliczono terminy usług: {vehicles}.")
+            queued = queue_due_reminders(batch_size=batch_size)
+        click.echo(f"{prefix}Zakolejkowano przypomnienia: {queued}.")
+
+
+@click.command('analytics-snapshot')
+@click.option('--interval', type=float, default=None, help="Odświeżaj co N sekund zamiast jednego przebiegu.")
+@with_appcontext
+def analytics_snapshot_command(interval):
+    """Buduje kolumnowy snapshot zakończonych zleceń dla analityki właściciela."""
+    # NumPy ładowany dopiero tutaj - start aplikacji go nie potrzebuje
+    import time
+
+    from .analytics import refresh_snapshot
+    from .branches import branch_codes, use_branch
+
+    while True:
+        for code in branch_codes() or [None]:
+            with use_branch(code):
+                orders = refresh_snapshot(code)
+            prefix = f"[{code}] " if code else ""
+            click.echo(f"{prefix}Snapshot analityki: {orders} zakończonych zleceń.")
+        if interval is None:
+            break
+        time.sleep(interval)
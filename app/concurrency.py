@@ -0,0 +1,63 @@
+import random
+import time
+
+from flask import flash, jsonify, redirect, request, url_for
+from sqlalchemy.orm.exc import StaleDataError
+
+from . import db
+from .loading import load_profile
+from .models import RepairOrder
+
+RETRY_ATTEMPTS = 8
+RETRY_BACKOFF = 0.005  # s, rośnie z każdą próbą
+
+
+class ConflictError(Exception):
+    pass
+
+
+def save_with_retry(repair_id, apply, attempts=RETRY_ATTEMPTS):
+    """Zapis dopisujący (notatka, część, zamknięcie) - przy konflikcie wersji nakłada zmianę na świeży wiersz.
+
+    apply(repair) może zwrócić False, żeby przerwać zapis (np. brak części); wtedy nic nie jest zapisywane.
+    """
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(random.uniform(0, RETRY_BACKOFF * attempt))
+        repair = db.session.get(RepairOrder, repair_id, options=load_profile('edit'), populate_existing=True)
+        if repair is None:
+            raise ConflictError()
+        try:
+            # Autoflush w apply() też może trafić na nowszą wersję - dlatego cały krok jest w try
+            if apply(repair) is False:
+                db.session.rollback()
+                return None
+            db.session.commit()
+            return repair
+        except StaleDataError:
+            db.session.rollback()
+    raise ConflictError()
+
+
+def is_stale(repair):
+    """Formularz wysłany na podstawie starszej wersji zlecenia niż ta w bazie."""
+    submitted = request.form.get('version', type=int)
+    return submitted is not None and submitted != repair.version
+
+
+def conflict_response(repair, endpoint):
+    # JSON dla interfejsu, który scala zmiany; zwykły formularz dostaje komunikat i świeży panel
+    current = {
+        'id': repair.id,
+        'version': repair.version,
+        'status': repair.status,
+        'description': repair.description,
+        'mechanic_id': repair.mechanic_id,
+        'mechanic_notes': repair.mechanic_notes,
+        'start_date': repair.start_date.isoformat() if repair.start_date else None,
+    }
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': 'conflict', 'current': current, 'submitted': request.form.to_dict()}), 409
+    flash(f'Zlecenie #{repair.id} zostało w międzyczasie zmienione przez kogoś innego. '
+          f'Sprawdź aktualne dane i zapisz ponownie.', 'error')
+    return redirect(url_for(endpoint))
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+from . import db
+from .models import FINISHED_STATUSES, Part, PartForecast, RepairOrder, RepairPart, RepairService
+
+FORECAST_WINDOW_DAYS = 180
+REVIEW_PERIOD_DAYS = 7
+SERVICE_LEVEL_Z = 1.65  # ok. 95% szans, że część nie skończy się w czasie dostawy
+
+
+def consumption_matrix(part_idx, day_idx, quantities, n_parts, n_days):
+    """Dzienne zużycie w macierzy [część x dzień], zliczone jednym bincount."""
+    flat = np.bincount(part_idx * n_days + day_idx, weights=quantities, minlength=n_parts * n_days)
+    return flat.reshape(n_parts, n_days)
+
+
+def service_part_usage(link_order, link_service, rp_order, rp_part, rp_qty, n_services, n_parts):
+    """Średnie zużycie każdej części na jedno zlecenie z daną usługą [usługa x część]."""
+    order = np.argsort(link_order, kind='stable')
+    link_order, link_service = link_order[order], link_service[order]
+
+    # Każdy wiersz części łączymy ze wszystkimi usługami swojego zlecenia
+    starts = np.searchsorted(link_order, rp_order, side='left')
+    counts = np.searchsorted(link_order, rp_order, side='right') - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    services = link_service[np.repeat(starts, counts) + offsets]
+    parts = np.repeat(rp_part, counts)
+    quantities = np.repeat(rp_qty, counts)
+
+    usage = np.bincount(services * n_parts + parts, weights=quantities, minlength=n_services * n_parts)
+    orders_per_service = np.bincount(link_service, minlength=n_services)
+    return usage.reshape(n_services, n_parts) / np.maximum(orders_per_service, 1)[:, None]
+
+
+def reorder_points(daily, lead_time, stock, pending_demand, z=SERVICE_LEVEL_Z, review_period=REVIEW_PERIOD_DAYS):
+    """Punkt zamówienia i sugerowana ilość dla każdej części (wektorowo)."""
+    rate = daily.mean(axis=1)
+    safety_stock = z * daily.std(axis=1) * np.sqrt(lead_time)
+    reorder_point = rate * lead_time + safety_stock + pending_demand
+    target = reorder_point + rate * review_period
+    suggested = np.where(stock <= reorder_point, np.ceil(target - stock), 0)
+    return rate, reorder_point, np.maximum(suggested, 0)
+
+
+def compute_forecast(now=None, window_days=FORECAST_WINDOW_DAYS):
+    now = now or datetime.now()
+    since = now - timedelta(days=window_days)
+
+    parts = db.session.query(Part.id, Part.stock_quantity, Part.lead_time_days).order_by(Part.id).all()
+    if not parts:
+        return []
+    part_ids = np.array([p[0] for p in parts])
+    stock = np.array([p[1] or 0 for p in parts], dtype=float)
+    lead_time = np.array([p[2] or 0 for p in parts], dtype=float)
+
+    rows = db.session.query(RepairPart.repair_id, RepairPart.part_id, RepairPart.quantity, RepairOrder.start_date) \
+        .join(RepairOrder, RepairPart.repair_id == RepairOrder.id) \
+        .filter(RepairOrder.start_date >= since, RepairOrder.start_date <= now).all()
+    rp_order = np.array([r[0] for r in rows], dtype=np.int64)
+    rp_part = np.searchsorted(part_ids, np.array([r[1] for r in rows], dtype=np.int64))
+    rp_qty = np.array([r[2] for r in rows], dtype=float)
+    dates = np.array([r[3] for r in rows], dtype='datetime64[D]')
+    day_idx = (dates - np.datetime64(since.date(), 'D')).astype(np.int64)
+    daily = consumption_matrix(rp_part, day_idx, rp_qty, len(part_ids), window_days + 1)
+
+    # Mix usług: zlecenia w toku jeszcze zużyją części typowe dla swoich usług
+    links = db.session.query(RepairService.repair_id, RepairService.service_id, RepairOrder.status) \
+        .join(RepairOrder, RepairService.repair_id == RepairOrder.id) \
+        .filter(RepairOrder.start_date >= since).all()
+    pending_demand = np.zeros(len(part_ids))
+    if links:
+        service_ids, link_service = np.unique(np.array([l[1] for l in links], dtype=np.int64), return_inverse=True)
+        link_order = np.array([l[0] for l in links], dtype=np.int64)
+        # Anulowane zlecenia nie zużyją części i nie uczą, ile części potrzebuje usługa
+        is_open = np.array([l[2] not in FINISHED_STATUSES for l in links])
+        is_done = np.array([l[2] == 'Gotowe' for l in links])
+        usage = service_part_usage(link_order[is_done], link_service[is_done],
+                                   rp_order, rp_part, rp_qty, len(service_ids), len(part_ids))
+        open_mix = np.bincount(link_service[is_open], minlength=len(service_ids))
+        pending_demand = open_mix @ usage
+
+    rate, reorder_point, suggested = reorder_points(daily, lead_time, stock, pending_demand)
+    return [
+        {'part_id': int(part_id), 'daily_rate': float(r), 'reorder_point': float(rp),
+         'suggested_quantity': int(s), 'computed_at': now}
+        for part_id, r, rp, s in zip(part_ids, rate, reorder_point, suggested)
+    ]
+
+
+def refresh_forecast(now=None):
+    forecasts = compute_forecast(now)
+    db.session.query(PartForecast).delete()
+    if forecasts:
+        db.session.execute(insert(PartForecast), forecasts)
+    db.session.commit()
+    return forecasts
+
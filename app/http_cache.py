@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+
+from flask import make_response, request
+from flask_login import current_user
+
+try:
+    import brotli
+except ImportError:  # brotli jest opcjonalny - bez niego zostaje gzip
+    brotli = None
+
+COMPRESSIBLE = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                'application/json', 'image/svg+xml')
+BROTLI_QUALITY = 5  # powyżej tego poziomu zysk w bajtach jest mały, a koszt CPU rośnie kilkukrotnie
+
+
+def etag_for(*parts):
+    """Krótki, stabilny ETag z danych, od których zależy treść odpowiedzi."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """Odpowiedź 304, jeśli klient ma już tę wersję - wtedy PDF w ogóle nie jest generowany."""
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+
+def pdf_response(data, filename, etag):
+    response = make_response(data)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.set_etag(etag)
+    # Faktury i raporty zawierają dane klientów: tylko przeglądarka, zawsze z rewalidacją przez ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def choose_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_response_layer(app):
+    """Nagłówki cache zależne od rodzaju odpowiedzi i kompresja dużych odpowiedzi tekstowych."""
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.endpoint == 'static':
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+        elif 'Cache-Control' not in response.headers and current_user.is_authenticated:
+            # Panele są inne dla każdego użytkownika - nie mogą trafić do wspólnego cache (proxy)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+
+        if response.status_code != 200 or response.mimetype not in COMPRESSIBLE \
+                or 'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+
+        # Pliki statyczne są wysyłane strumieniowo - do kompresji trzeba wczytać je do pamięci
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        if encoding == 'br':
+            data = brotli.compress(data, quality=BROTLI_QUALITY)
+        else:
+            data = gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        # Inna reprezentacja tej samej treści - ETag staje się słaby, ale nadal pasuje przy If-None-Match
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,45 @@
+from sqlalchemy.orm import configure_mappers, joinedload, load_only, selectinload
+
+from .models import RepairOrder, RepairPart, Vehicle
+
+# Relacje z backref (np. RepairOrder.vehicle) istnieją dopiero po skonfigurowaniu mapperów
+configure_mappers()
+
+# Co widok faktycznie pokazuje - relacje spoza profilu nie są doładowywane w szablonie
+PROFILES = {
+    # Tabele zleceń i formularz edycji (recepcja): pojazd z właścicielem, mechanik i usługa ze zlecenia
+    'list': (
+        joinedload(RepairOrder.vehicle).joinedload(Vehicle.owner),
+        joinedload(RepairOrder.mechanic),
+        selectinload(RepairOrder.service_links),
+    ),
+    # Karta jednego zlecenia: szczegóły dla klienta, zadanie mechanika
+    'detail': (
+        joinedload(RepairOrder.vehicle),
+        selectinload(RepairOrder.service_links),
+        selectinload(RepairOrder.used_parts).joinedload(RepairPart.part),
+    ),
+    # Faktura: dane klienta i pozycje z cenami z chwili naprawy
+    'invoice': (
+        joinedload(RepairOrder.vehicle).joinedload(Vehicle.owner),
+        selectinload(RepairOrder.service_links),
+        selectinload(RepairOrder.used_parts).joinedload(RepairPart.part),
+    ),
+    # Zapis zlecenia: pozycje do przeliczenia sum i klient do powiadomienia o zmianie statusu
+    'edit': (
+        joinedload(RepairOrder.vehicle).joinedload(Vehicle.owner),
+        selectinload(RepairOrder.service_links),
+        selectinload(RepairOrder.used_parts),
+    ),
+    # Historia zakończonych prac: daty, kwoty i pojazd, bez pozycji zlecenia
+    'report': (
+        load_only(RepairOrder.id, RepairOrder.status, RepairOrder.start_date, RepairOrder.end_date,
+                  RepairOrder.grand_total, RepairOrder.vehicle_id, RepairOrder.version),
+        joinedload(RepairOrder.vehicle),
+    ),
+}
+
+
+def load_profile(name):
+    """Opcje zapytania dla profilu; relacje spoza profilu rzucają wyjątek przy dostępie (models.LAZY)."""
+    return PROFILES[name]
@@ -1,11 +1,14 @@
 from . import db
 from flask_login import UserMixin
+from datetime import datetime
 from sqlalchemy.sql import func
 
-repair_services = db.Table('repair_services',
-                           db.Column('repair_id', db.Integer, db.ForeignKey('repair_order.id'), primary_key=True),
-                           db.Column('service_id', db.Integer, db.ForeignKey('service.id'), primary_key=True)
-                           )
+REPAIR_STATUSES = ('Zgłoszone', 'Przyjęte do realizacji', 'W trakcie diagnozy', 'W trakcie naprawy',
+                   'Czeka na części', 'Gotowe', 'Anulowane')
+FINISHED_STATUSES = ('Gotowe', 'Anulowane')
+# Relacje nie ładują się po cichu: zapytanie wskazuje je w opcjach (profile w app/loading.py),
+# a dostęp do niezaładowanej rzuca wyjątek zamiast wysyłać kolejne zapytanie (N+1)
+LAZY = 'raise_on_sql'
 
 # UŻYTKOWNICY
 class User(db.Model, UserMixin):
@@ -22,8 +25,14 @@ class User(db.Model, UserMixin):
 
     specialization = db.Column(db.String(100), nullable=True)
 
-    vehicles = db.relationship('Vehicle', backref='owner', lazy=True)
-    repairs_assigned = db.relationship('RepairOrder', backref='mechanic', lazy=True)
+    vehicles = db.relationship('Vehicle', backref=db.backref('owner', lazy=LAZY), lazy=LAZY)
+    repairs_assigned = db.relationship('RepairOrder', backref=db.backref('mechanic', lazy=LAZY), lazy=LAZY)
+
+    # Oddział, w którego bazie jest konto (nie kolumna) - id użytkowników powtarzają się między bazami
+    branch = None
+
+    def get_id(self):
+        return f"{self.branch}:{self.id}" if self.branch else str(self.id)
 
 # POJAZDY I ZLECENIA
 class Vehicle(db.Model):
@@ -34,7 +43,7 @@ class Vehicle(db.Model):
     registration_number = db.Column(db.String(20), unique=True, nullable=False)
 
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    repairs = db.relationship('RepairOrder', backref='vehicle', lazy=True)
+    repairs = db.relationship('RepairOrder', backref=db.backref('vehicle', lazy=LAZY), lazy=LAZY)
 
 class RepairOrder(db.Model):
 
@@ -49,9 +58,45 @@ class RepairOrder(db.Model):
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     mechanic_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
-    used_parts = db.relationship('RepairPart', backref='repair', lazy=True)
-    services = db.relationship('Service', secondary=repair_services, lazy='subquery',
-                               backref=db.backref('repairs', lazy=True))
+    # Blokowanie optymistyczne: każdy UPDATE ma warunek na wersję i podbija ją o 1
+    version = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {'version_id_col': version}
+    # Kolejka mechanika: jego zlecenia filtrowane po statusie i sortowane po terminie
+    __table_args__ = (db.Index('ix_repair_order_mechanic_status', 'mechanic_id', 'status', 'start_date'),)
+
+    # Koszty utrzymywane przy każdym zapisie - odczyty nie sumują pozycji na nowo
+    parts_total = db.Column(db.Float, nullable=False, default=0.0)
+    services_total = db.Column(db.Float, nullable=False, default=0.0)
+    grand_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    used_parts = db.relationship('RepairPart', backref=db.backref('repair', lazy=LAZY), lazy=LAZY)
+    service_links = db.relationship('RepairService', backref=db.backref('repair', lazy=LAZY), lazy=LAZY,
+                                    cascade='all, delete-orphan')
+
+    def add_service(self, service):
+        if any(link.service_id == service.id for link in self.service_links):
+            return
+        self.service_links.append(RepairService(service_id=service.id, name=service.name, price=service.base_price))
+        self.recalculate_totals()
+
+    def replace_service(self, service):
+        # Zlecenie z recepcji ma jedną usługę główną - podmieniamy pierwszą pozycję
+        if self.service_links:
+            if any(link.service_id == service.id for link in self.service_links):
+                return
+            self.service_links.remove(self.service_links[0])
+        self.add_service(service)
+
+    def add_part(self, part, quantity):
+        item = RepairPart(part_id=part.id, quantity=quantity, unit_price=part.price)
+        self.used_parts.append(item)
+        self.recalculate_totals()
+        return item
+
+    def recalculate_totals(self):
+        self.parts_total = sum(item.unit_price * item.quantity for item in self.used_parts)
+        self.services_total = sum(link.price for link in self.service_links)
+        self.grand_total = self.parts_total + self.services_total
 
 # MAGAZYN I USŁUGI
 class Part(db.Model):
@@ -61,6 +106,55 @@ class Part(db.Model):
     code = db.Column(db.String(50), unique=True)
     price = db.Column(db.Float, nullable=False)
     stock_quantity = db.Column(db.Integer, default=0)
+    lead_time_days = db.Column(db.Integer, nullable=False, default=3)
+
+class Notification(db.Model):
+    # Outbox: wiersz powstaje w tej samej transakcji co zmiana statusu, wysyła go dopiero worker
+    id = db.Column(db.Integer, primary_key=True)
+    repair_id = db.Column(db.Integer, db.ForeignKey('repair_order.id'), nullable=False)
+    # 'status' - o zmianie statusu zlecenia, 'reminder' - przypomnienie o terminie usługi
+    kind = db.Column(db.String(10), nullable=False, default='status')
+    channel = db.Column(db.String(10), nullable=False)
+    recipient = db.Column(db.String(150), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+
+class StockMovement(db.Model):
+    # Księga magazynowa: każda dostawa, wydanie i rezerwacja to nowy wiersz, istniejące się nie zmieniają
+    __table_args__ = (db.Index('ix_stock_movement_part', 'part_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    part_id = db.Column(db.Integer, db.ForeignKey('part.id'), nullable=False)
+    # Bez klucza obcego - historia magazynu zostaje także po usunięciu zlecenia
+    repair_id = db.Column(db.Integer, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # adjustment, receipt, consumption, reservation, release
+    on_hand_delta = db.Column(db.Integer, nullable=False, default=0)
+    reserved_delta = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    part = db.relationship('Part', lazy=LAZY)
+
+class StockSnapshot(db.Model):
+    # Stan po ruchu last_movement_id, nadpisywany przez `flask stock-snapshot`; bieżący stan = snapshot + nowsze ruchy
+    part_id = db.Column(db.Integer, db.ForeignKey('part.id'), primary_key=True)
+    last_movement_id = db.Column(db.Integer, nullable=False)
+    on_hand = db.Column(db.Integer, nullable=False)
+    reserved = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+
+class PartForecast(db.Model):
+    # Wynik zadania wsadowego forecast-parts, nadpisywany przy każdym przeliczeniu
+    part_id = db.Column(db.Integer, db.ForeignKey('part.id'), primary_key=True)
+    daily_rate = db.Column(db.Float, nullable=False)
+    reorder_point = db.Column(db.Float, nullable=False)
+    suggested_quantity = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    part = db.relationship('Part', lazy=LAZY)
 
 class RepairPart(db.Model):
 
@@ -68,10 +162,71 @@ class RepairPart(db.Model):
     repair_id = db.Column(db.Integer, db.ForeignKey('repair_order.id'), nullable=False)
     part_id = db.Column(db.Integer, db.ForeignKey('part.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    part = db.relationship('Part')
+    # Cena z chwili użycia - późniejsza zmiana cennika nie zmienia historycznych faktur
+    unit_price = db.Column(db.Float, nullable=False, default=0.0)
+    part = db.relationship('Part', lazy=LAZY)
+
+class RepairService(db.Model):
+    __tablename__ = 'repair_services'
+
+    repair_id = db.Column(db.Integer, db.ForeignKey('repair_order.id'), primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey('service.id'), primary_key=True)
+    name = db.Column(db.String(100), nullable=False, default='')
+    price = db.Column(db.Float, nullable=False, default=0.0)
+    service = db.relationship('Service', lazy=LAZY)
 
 class Service(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    base_price = db.Column(db.Float, nullable=False)
\ No newline at end of file
+    base_price = db.Column(db.Float, nullable=False)
+    # Co ile dni przypominać klientowi o kolejnym wykonaniu (NULL = usługa bez przypomnień)
+    reminder_days = db.Column(db.Integer)
+
+
+class ServiceDue(db.Model):
+    # Projekcja terminów: jeden wiersz na pojazd i usługę, aktualizowany przy zakończeniu zlecenia
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey('service.id'), primary_key=True)
+    last_repair_id = db.Column(db.Integer, nullable=False)
+    last_done_at = db.Column(db.DateTime, nullable=False)
+    next_due = db.Column(db.DateTime, nullable=False, index=True)
+    # Kiedy wysłać przypomnienie; NULL po wysłaniu - zakres remind_at <= teraz obejmuje tylko oczekujące
+    remind_at = db.Column(db.DateTime, index=True)
+
+    vehicle = db.relationship('Vehicle', lazy=LAZY)
+    service = db.relationship('Service', lazy=LAZY)
+
+
+def backfill_price_snapshots(connection):
+    """Uzupełnia ceny i sumy w zleceniach zapisanych przed wprowadzeniem migawek cen."""
+    connection.execute(db.text(
+        "UPDATE repair_part SET unit_price = "
+        "(SELECT price FROM part WHERE part.id = repair_part.part_id)"))
+    connection.execute(db.text(
+        "UPDATE repair_services SET "
+        "name = (SELECT name FROM service WHERE service.id = repair_services.service_id), "
+        "price = (SELECT base_price FROM service WHERE service.id = repair_services.service_id)"))
+    connection.execute(db.text(
+        "UPDATE repair_order SET "
+        "parts_total = (SELECT COALESCE(SUM(unit_price * quantity), 0) FROM repair_part "
+        "WHERE repair_part.repair_id = repair_order.id), "
+        "services_total = (SELECT COALESCE(SUM(price), 0) FROM repair_services "
+        "WHERE repair_services.repair_id = repair_order.id)"))
+    connection.execute(db.text("UPDATE repair_order SET grand_total = parts_total + services_total"))
+
+
+def backfill_reminder_days(connection):
+    """Domyślne interwały przypomnień dla usług okresowych z katalogu startowego."""
+    connection.execute(db.text(
+        "UPDATE service SET reminder_days = 365 "
+        "WHERE name IN ('Przegląd okresowy', 'Wymiana oleju i filtrów')"))
+
+
+def backfill_opening_balances(connection):
+    """Bilans otwarcia w księdze dla części, które mają stan, ale jeszcze żadnego ruchu."""
+    connection.execute(db.text(
+        "INSERT INTO stock_movement (part_id, kind, on_hand_delta, reserved_delta, created_at) "
+        "SELECT id, 'adjustment', stock_quantity, 0, CURRENT_TIMESTAMP FROM part "
+        "WHERE COALESCE(stock_quantity, 0) <> 0 "
+        "AND NOT EXISTS (SELECT 1 FROM stock_movement WHERE stock_movement.part_id = part.id)"))
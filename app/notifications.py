@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from . import db
+from .models import Notification
+
+NOTIFY_STATUSES = ('Gotowe', 'Czeka na części')
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30  # 30 s, 1 min, 2 min, 4 min...
+
+MESSAGES = {
+    'Gotowe': ('Pojazd {registration} gotowy do odbioru',
+               'Dzień dobry,\n\nnaprawa zlecenia #{id} ({make} {model}, {registration}) została zakończona. '
+               'Zapraszamy po odbiór pojazdu.\n\nWarsztat'),
+    'Czeka na części': ('Zlecenie #{id} czeka na części',
+                        'Dzień dobry,\n\nnaprawa pojazdu {make} {model} ({registration}) jest wstrzymana do czasu '
+                        'dostawy brakujących części. Poinformujemy o zakończeniu.\n\nWarsztat'),
+}
+
+
+def queue_status_notification(repair, old_status):
+    """Dodaje powiadomienia do sesji zlecenia - zapisują się w tym samym commicie co zmiana statusu."""
+    if repair.status == old_status or repair.status not in NOTIFY_STATUSES:
+        return
+    owner = repair.vehicle.owner
+    fields = {'id': repair.id, 'make': repair.vehicle.make, 'model': repair.vehicle.model,
+              'registration': repair.vehicle.registration_number}
+    subject, body = (text.format(**fields) for text in MESSAGES[repair.status])
+    queue_notification(repair.id, owner, subject, body)
+
+
+def queue_notification(repair_id, owner, subject, body, kind='status'):
+    """Jeden wiersz outboxu na każdy włączony kanał, dla którego klient podał kontakt."""
+    recipients = {'email': owner.email, 'sms': owner.phone_number}
+    for channel in current_app.config['NOTIFY_CHANNELS']:
+        if recipients.get(channel):
+            db.session.add(Notification(repair_id=repair_id, kind=kind, channel=channel,
+                                        recipient=recipients[channel], subject=subject, body=body))
+
+
+class EmailAdapter:
+    def __init__(self, host, port, sender):
+        self.host, self.port, self.sender = host, port, sender
+
+    def send(self, notification):
+        # smtplib i urllib.request ładowane dopiero przez worker - żądania tylko zapisują outbox
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = notification.recipient
+        message['Subject'] = notification.subject
+        message.set_content(notification.body)
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+
+class SmsGatewayAdapter:
+    # Bramka HTTP: POST {"to": ..., "text": ...}, każda odpowiedź 2xx oznacza przyjęcie wiadomości
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, notification):
+        import urllib.request
+
+        payload = json.dumps({'to': notification.recipient, 'text': notification.body}).encode()
+        request = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+
+def build_adapters(config):
+    adapters = {'email': EmailAdapter(config['SMTP_HOST'], config['SMTP_PORT'], config['MAIL_SENDER'])}
+    if config['SMS_GATEWAY_URL']:
+        adapters['sms'] = SmsGatewayAdapter(config['SMS_GATEWAY_URL'])
+    return adapters
+
+
+def drain_outbox(adapters, batch_size=50, now=None):
+    """Wysyła jedną paczkę zaległych powiadomień; błędy wracają do kolejki z wykładniczym odstępem."""
+    now = now or datetime.now()
+    batch = Notification.query.filter(Notification.status == 'pending', Notification.next_attempt_at <= now) \
+        .order_by(Notification.next_attempt_at, Notification.id).limit(batch_size).all()
+
+    sent = 0
+    for notification in batch:
+        try:
+            adapter = adapters.get(notification.channel)
+            if adapter is None:
+                raise LookupError(f"Brak adaptera dla kanału '{notification.channel}'")
+            adapter.send(notification)
+        except Exception as error:
+            notification.attempts += 1
+            notification.last_error = str(error)
+            if notification.attempts >= MAX_ATTEMPTS:
+                notification.status = 'failed'
+            else:
+                notification.next_attempt_at = now + timedelta(
+                    seconds=RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1))
+        else:
+            notification.status = 'sent'
+            notification.sent_at = now
+            sent += 1
+    db.session.commit()
+    return sent, len(batch)
@@ -0,0 +1,11 @@
+from importlib import import_module
+
+# Panele ról - każdy to osobny blueprint, ładowany tylko gdy jest na liście PANELS w konfiguracji
+PANELS = ('client', 'reception', 'mechanic', 'owner')
+
+
+def register_panels(app, names):
+    for name in names:
+        if name not in PANELS:
+            raise ValueError(f"Nieznany panel: {name}")
+        app.register_blueprint(import_module(f'.{name}', __name__).bp)
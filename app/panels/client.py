@@ -0,0 +1,173 @@
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from ..loading import load_profile
+from ..models import Vehicle, RepairOrder, db, Service
+
+
+bp = Blueprint('client', __name__)
+
+
+def client_vehicles():
+    return Vehicle.query.filter_by(owner_id=current_user.id).order_by(Vehicle.id).all()
+
+
+@bp.route('/panel/client')
+@login_required
+def client_panel():
+    if current_user.role != 'client': return redirect(url_for('main.dashboard'))
+    return render_template('client_panel.html', vehicles=client_vehicles(), user=current_user)
+
+
+@bp.route('/client/add_vehicle', methods=['POST'])
+@login_required
+def client_add_vehicle():
+    if current_user.role != 'client': return "Brak uprawnień", 403
+
+    make = request.form.get('make')
+    model = request.form.get('model')
+    registration_number = request.form.get('registration_number')
+    vin = request.form.get('vin')
+
+    if vin:
+        clean_vin = vin.replace(' ', '').replace('-', '').upper()
+
+        if len(clean_vin) > 0:
+            if len(clean_vin) != 17:
+                flash('Numer VIN musi mieć dokładnie 17 znaków!', 'error')
+                return redirect(url_for('client.client_panel'))
+
+            if not clean_vin.isalnum():
+                flash('VIN może zawierać tylko cyfry i litery (bez znaków specjalnych)!', 'error')
+                return redirect(url_for('client.client_panel'))
+            vin = clean_vin
+        else:
+            vin = None
+
+    if Vehicle.query.filter_by(registration_number=registration_number).first():
+        flash('Pojazd o takiej rejestracji już istnieje w systemie.', 'error')
+        return redirect(url_for('client.client_panel'))
+
+    if vin and Vehicle.query.filter_by(vin=vin).first():
+        flash('Pojazd o takim numerze VIN już istnieje w systemie.', 'error')
+        return redirect(url_for('client.client_panel'))
+    new_car = Vehicle(
+        make=make,
+        model=model,
+        vin=vin,
+        registration_number=registration_number,
+        owner_id=current_user.id
+    )
+    db.session.add(new_car)
+    db.session.commit()
+
+    flash(f'Pojazd {make} {model} został dodany!')
+    return redirect(url_for('client.client_panel'))
+
+
+@bp.route('/client/delete_vehicle/<int:vehicle_id>', methods=['POST'])
+@login_required
+def client_delete_vehicle(vehicle_id):
+    if current_user.role != 'client': return "Brak uprawnień", 403
+
+    vehicle = Vehicle.query.filter_by(id=vehicle_id, owner_id=current_user.id).first_or_404()
+
+    try:
+        db.session.delete(vehicle)
+        db.session.commit()
+        flash('Pojazd został usunięty z Twojej listy.')
+    except IntegrityError:
+        db.session.rollback()
+        flash('BŁĄD: Nie można usunąć pojazdu, który posiada aktywne zlecenia lub historię napraw!', 'error')
+
+    return redirect(url_for('client.client_panel'))
+
+
+@bp.route('/client/check_status', methods=['POST'])
+@login_required
+def client_check_status():
+    if current_user.role != 'client': return "Brak uprawnień", 403
+    order_id = request.form.get('order_id')
+    if not order_id:
+        flash('Podaj numer zlecenia.', 'warning')
+        return redirect(url_for('client.client_panel'))
+
+    repair = db.session.query(RepairOrder.id, RepairOrder.status).join(Vehicle) \
+        .filter(RepairOrder.id == order_id, Vehicle.owner_id == current_user.id).first()
+    if repair:
+        status_color = "success" if repair.status == 'Gotowe' else "warning" if repair.status == 'Czeka na części' else "info"
+        flash(f'Zlecenie #{repair.id} - Aktualny status: {repair.status}', status_color)
+    else:
+        flash(f'Nie znaleziono zlecenia o numerze #{order_id} na Twoim koncie.', 'error')
+    return redirect(url_for('client.client_panel'))
+
+
+@bp.route('/book_appointment', methods=['GET', 'POST'])
+@login_required
+def book_appointment():
+    if current_user.role != 'client': return "Brak uprawnień", 403
+
+    if request.method == 'POST':
+        vehicle_id = request.form.get('vehicle_id')
+        service_id = request.form.get('service_id')
+        date_str = request.form.get('date')
+        time_str = request.form.get('time')
+        # 1. Odbieramy notatki klienta
+        client_notes = request.form.get('client_notes')
+
+        if not all([vehicle_id, service_id, date_str, time_str]):
+            flash('Wypełnij wszystkie wymagane pola!', 'error')
+            return redirect(url_for('client.book_appointment'))
+
+        try:
+            full_date = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+
+            final_description = "Rezerwacja Online"
+            if client_notes and client_notes.strip():
+                final_description += f": {client_notes}"
+            else:
+                final_description += ": Wybrana usługa z listy."
+
+            new_order = RepairOrder(
+                vehicle_id=vehicle_id,
+                description=final_description,
+                status="Zgłoszone",
+                start_date=full_date
+            )
+
+            selected_service = Service.query.get(service_id)
+            if selected_service:
+                new_order.add_service(selected_service)
+
+            db.session.add(new_order)
+            db.session.commit()
+            flash(f'Zarezerwowano wizytę na {date_str} {time_str}.')
+            return redirect(url_for('client.client_panel'))
+        except ValueError:
+            flash('Nieprawidłowy format daty.', 'error')
+    # Link z przypomnienia o terminie podpowiada pojazd i usługę
+    return render_template('book_appointment.html', vehicles=client_vehicles(), services=Service.query.all(),
+                           selected_vehicle=request.args.get('vehicle_id', type=int),
+                           selected_service=request.args.get('service_id', type=int))
+
+
+@bp.route('/history')
+@login_required
+def client_history():
+    my_repairs = RepairOrder.query.join(Vehicle).options(*load_profile('report')).filter(
+        Vehicle.owner_id == current_user.id, RepairOrder.status == 'Gotowe'
+    ).order_by(RepairOrder.end_date.desc()).all()
+    return render_template('repair_history.html', repairs=my_repairs)
+
+
+@bp.route('/history/<int:repair_id>')
+@login_required
+def repair_details(repair_id):
+    repair = RepairOrder.query.options(*load_profile('detail')).filter_by(id=repair_id).first_or_404()
+    if repair.vehicle.owner_id != current_user.id:
+        flash('Nie masz dostępu do tego zlecenia.')
+        return redirect(url_for('client.client_history'))
+
+    return render_template('repair_details.html', repair=repair, parts_cost=repair.parts_total,
+                           services_cost=repair.services_total, total_cost=repair.grand_total)
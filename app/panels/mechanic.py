@@ -0,0 +1,156 @@
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from sqlalchemy import case, select, update
+from sqlalchemy.orm.exc import StaleDataError
+from ..concurrency import ConflictError, conflict_response, is_stale, save_with_retry
+from ..loading import load_profile
+from ..models import FINISHED_STATUSES, RepairOrder, db, Part
+from ..notifications import queue_status_notification
+from ..stock import record_movement, reservations, stock_levels
+
+
+bp = Blueprint('mechanic', __name__)
+
+# Najpierw praca w toku, potem nowe zlecenia; wstrzymane przez brak części na końcu kolejki
+TASK_PRIORITY = case({'W trakcie naprawy': 0, 'W trakcie diagnozy': 1, 'Przyjęte do realizacji': 2,
+                      'Zgłoszone': 3, 'Czeka na części': 4}, value=RepairOrder.status, else_=5)
+DONE_PER_PAGE = 10
+
+
+def task_queue(mechanic_id):
+    """Aktywne zlecenia mechanika z wszystkim, co pokazuje karta zadania, w kilku zapytaniach."""
+    return RepairOrder.query \
+        .filter(RepairOrder.mechanic_id == mechanic_id, RepairOrder.status.not_in(FINISHED_STATUSES)) \
+        .options(*load_profile('detail')) \
+        .order_by(TASK_PRIORITY, RepairOrder.start_date, RepairOrder.id).all()
+
+
+def finished_tasks(mechanic_id, page):
+    return db.paginate(
+        select(RepairOrder)
+        .where(RepairOrder.mechanic_id == mechanic_id, RepairOrder.status.in_(FINISHED_STATUSES))
+        .options(*load_profile('report'))
+        .order_by(RepairOrder.end_date.desc(), RepairOrder.id.desc()),
+        page=page, per_page=DONE_PER_PAGE, error_out=False)
+
+
+@bp.route('/panel/mechanic')
+@login_required
+def mechanic_panel():
+    if current_user.role != 'mechanic': return redirect(url_for('main.dashboard'))
+    done = finished_tasks(current_user.id, request.args.get('page', 1, type=int))
+    tasks = task_queue(current_user.id)
+    # Sztuki zarezerwowane dla zlecenia są do wzięcia na tym zleceniu, choć w stanie ogólnym już ich nie ma
+    reserved = {(repair_id, part_id): quantity
+                for repair_id, part_id, quantity in reservations([task.id for task in tasks])}
+    return render_template('mechanic_panel.html', tasks=tasks, done=done, parts=Part.query.all(),
+                           stock=stock_levels(), reserved=reserved, user=current_user)
+
+
+@bp.route('/mechanic/update_order/<int:repair_id>', methods=['POST'])
+@login_required
+def mechanic_update_order(repair_id):
+    if current_user.role != 'mechanic': return "Brak uprawnień", 403
+    repair = RepairOrder.query.options(*load_profile('edit')).filter_by(id=repair_id).first_or_404()
+    if is_stale(repair):
+        return conflict_response(repair, 'mechanic.mechanic_panel')
+    new_status = request.form.get('status')
+    notes = request.form.get('mechanic_notes')
+    old_status = repair.status
+
+    if new_status:
+        repair.status = new_status
+        if new_status == 'Gotowe': repair.end_date = datetime.now()
+    if notes:
+        repair.mechanic_notes = notes
+    queue_status_notification(repair, old_status)
+
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response(repair, 'mechanic.mechanic_panel')
+    flash(f'Zaktualizowano zlecenie #{repair.id}.')
+    return redirect(url_for('mechanic.mechanic_panel'))
+
+
+@bp.route('/report_missing_part/<int:repair_id>', methods=['POST'])
+@login_required
+def report_missing_part(repair_id):
+    if current_user.role != 'mechanic': return "Brak uprawnień", 403
+    repair = RepairOrder.query.get_or_404(repair_id)
+    part = Part.query.get_or_404(request.form.get('part_id'))
+    quantity = max(request.form.get('quantity', 1, type=int), 1)
+    new_note = f"[{datetime.now().strftime('%Y-%m-%d %H:%M')}] ZAPOTRZEBOWANIE: Brak części '{part.name}' (x{quantity})."
+
+    def append_note(repair):
+        old_status = repair.status
+        repair.status = 'Czeka na części'
+        repair.mechanic_notes = (repair.mechanic_notes + "\n" + new_note) if repair.mechanic_notes else new_note
+        # Rezerwacja: najbliższa dostawa tej części jest zatrzymana dla tego zlecenia
+        record_movement(part, 'reservation', reserved=quantity, repair_id=repair.id)
+        queue_status_notification(repair, old_status)
+
+    try:
+        save_with_retry(repair.id, append_note)
+    except ConflictError:
+        return conflict_response(repair, 'mechanic.mechanic_panel')
+    flash(f'Zgłoszono brak: {part.name}.')
+    return redirect(url_for('mechanic.mechanic_panel'))
+
+
+@bp.route('/add_part/<int:repair_id>', methods=['POST'])
+@login_required
+def add_part(repair_id):
+    if current_user.role != 'mechanic': return "Brak uprawnień", 403
+    repair = RepairOrder.query.get_or_404(repair_id)
+    part = Part.query.get(request.form.get('part_id'))
+    quantity = int(request.form.get('quantity'))
+
+    def take_part(repair):
+        # Sztuki zarezerwowane dla innych zleceń nie są do wzięcia; własna rezerwacja tak
+        own = sum(reserved for _, part_id, reserved in reservations([repair.id]) if part_id == part.id)
+        if stock_levels([part.id])[part.id].available + own < quantity:
+            return False
+        # Warunkowy UPDATE - dwóch mechaników nie wyda tej samej sztuki
+        taken = db.session.execute(
+            update(Part).where(Part.id == part.id, Part.stock_quantity >= quantity)
+            .values(stock_quantity=Part.stock_quantity - quantity)
+        ).rowcount
+        if not taken:
+            return False
+        record_movement(part, 'consumption', on_hand=-quantity, repair_id=repair.id)
+        if own:
+            record_movement(part, 'release', reserved=-min(own, quantity), repair_id=repair.id)
+        repair.add_part(part, quantity)
+
+    try:
+        added = part and save_with_retry(repair.id, take_part)
+    except ConflictError:
+        return conflict_response(repair, 'mechanic.mechanic_panel')
+    if added:
+        flash(f'Dodano {part.name} (x{quantity}).')
+    else:
+        flash('Brak części w magazynie!', 'error')
+    return redirect(url_for('mechanic.mechanic_panel'))
+
+
+@bp.route('/complete_repair/<int:repair_id>', methods=['POST'])
+@login_required
+def complete_repair(repair_id):
+    if current_user.role not in ['mechanic', 'owner']: return "Brak uprawnień", 403
+    repair = RepairOrder.query.get_or_404(repair_id)
+
+    def close(repair):
+        old_status = repair.status
+        repair.status = 'Gotowe'
+        repair.end_date = datetime.now()
+        queue_status_notification(repair, old_status)
+
+    try:
+        save_with_retry(repair.id, close)
+    except ConflictError:
+        return conflict_response(repair, 'mechanic.mechanic_panel')
+    flash(f'Zlecenie #{repair.id} zakończone!')
+    return redirect(url_for('mechanic.mechanic_panel'))
@@ -0,0 +1,223 @@
+import asyncio
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required, current_user
+from werkzeug.security import generate_password_hash
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+from ..branches import branch_codes, for_each_branch
+from ..parallel import run_query
+from ..http_cache import etag_for, not_modified, pdf_response
+from ..models import FINISHED_STATUSES, User, Vehicle, RepairOrder, db, Service, ServiceDue, Part, PartForecast
+from ..reminders import rebuild_service_due
+from ..stock import record_movement, stock_levels
+
+
+bp = Blueprint('owner', __name__)
+
+def finished_summary(connection):
+    return connection.execute(
+        select(func.count(RepairOrder.id), func.coalesce(func.sum(RepairOrder.grand_total), 0),
+               func.coalesce(func.sum(RepairOrder.parts_total), 0))
+        .where(RepairOrder.status == 'Gotowe')
+    ).one()
+
+
+def active_count(connection):
+    return connection.execute(
+        select(func.count(RepairOrder.id)).where(RepairOrder.status.not_in(FINISHED_STATUSES))
+    ).scalar()
+
+
+def finished_orders(connection):
+    return connection.execute(
+        select(RepairOrder.id, RepairOrder.start_date, RepairOrder.grand_total, Vehicle.make, Vehicle.model)
+        .join(Vehicle, RepairOrder.vehicle_id == Vehicle.id)
+        .where(RepairOrder.status == 'Gotowe')
+        .order_by(RepairOrder.start_date)
+    ).all()
+
+@bp.route('/panel/owner')
+@login_required
+async def owner_panel():
+    if current_user.role != 'owner': return redirect(url_for('main.dashboard'))
+
+    # Niezależne zapytania idą równolegle; statystyki obejmują wszystkie oddziały
+    summaries, active, employees, services, reorders, (parts, stock) = await asyncio.gather(
+        asyncio.to_thread(for_each_branch, finished_summary),
+        asyncio.to_thread(for_each_branch, active_count),
+        run_query(lambda s: s.query(User).filter(User.role.in_(['mechanic', 'reception'])).all()),
+        run_query(lambda s: s.query(Service).all()),
+        run_query(lambda s: s.query(PartForecast).options(joinedload(PartForecast.part)).filter(PartForecast.suggested_quantity > 0)
+                  .order_by(PartForecast.suggested_quantity.desc()).all()),
+        run_query(lambda s: (s.query(Part).order_by(Part.name).all(), stock_levels(session=s))),
+    )
+
+    return render_template('owner_panel.html',
+                           employees=employees,
+                           services=services,
+                           total_income=sum(summary[1] for summary in summaries.values()),
+                           active_count=sum(active.values()),
+                           finished_count=sum(summary[0] for summary in summaries.values()),
+                           reorders=reorders,
+                           parts=parts,
+                           stock=stock)
+
+
+@bp.route('/owner/analytics')
+@login_required
+def owner_analytics():
+    if current_user.role != 'owner': return redirect(url_for('main.dashboard'))
+    # Zestawienia liczone z pliku snapshotu (`flask analytics-snapshot`), bez zapytań do tabel zleceń
+    from ..analytics import combine, load_snapshot, snapshot_path, summarize
+
+    snapshots = [snapshot for snapshot in (load_snapshot(snapshot_path(code)) for code in branch_codes() or [None])
+                 if snapshot is not None]
+    if not snapshots:
+        flash('Brak danych analitycznych - uruchom: flask analytics-snapshot', 'info')
+        return redirect(url_for('owner.owner_panel'))
+    return render_template('owner_analytics.html', report=summarize(combine(snapshots)))
+
+
+@bp.route('/owner/add_employee', methods=['POST'])
+@login_required
+def add_employee():
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    email = request.form.get('email')
+    if User.query.filter_by(email=email).first():
+        flash('Taki email już istnieje!', 'error')
+    else:
+        hashed_pw = generate_password_hash(request.form.get('password'))
+        new_emp = User(
+            email=email, password=hashed_pw,
+            first_name=request.form.get('first_name'),
+            last_name=request.form.get('last_name'),
+            role=request.form.get('role')
+        )
+        db.session.add(new_emp)
+        db.session.commit()
+        flash(f'Dodano pracownika: {new_emp.first_name}')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/delete_employee/<int:user_id>', methods=['POST'])
+@login_required
+def delete_employee(user_id):
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    user = User.query.get_or_404(user_id)
+    if user.role == 'owner':
+        flash('Nie możesz usunąć samego siebie!', 'error')
+    else:
+        db.session.delete(user)
+        db.session.commit()
+        flash('Usunięto pracownika.')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/stock/receive', methods=['POST'])
+@login_required
+def receive_delivery():
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    part = Part.query.get_or_404(request.form.get('part_id'))
+    quantity = request.form.get('quantity', type=int)
+    if not quantity or quantity < 1:
+        flash('Podaj liczbę dostarczonych sztuk.', 'error')
+        return redirect(url_for('owner.owner_panel'))
+    db.session.execute(update(Part).where(Part.id == part.id).values(stock_quantity=Part.stock_quantity + quantity))
+    record_movement(part, 'receipt', on_hand=quantity)
+    db.session.commit()
+    flash(f'Przyjęto dostawę: {part.name} (x{quantity}).')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/add_service', methods=['POST'])
+@login_required
+def add_service():
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    db.session.add(Service(name=request.form.get('name'), base_price=float(request.form.get('price')),
+                           reminder_days=request.form.get('reminder_days', type=int)))
+    db.session.commit()
+    flash('Dodano usługę.')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/edit_service/<int:service_id>', methods=['POST'])
+@login_required
+def edit_service(service_id):
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    service = Service.query.get_or_404(service_id)
+    service.name = request.form.get('name')
+    service.base_price = float(request.form.get('price'))
+    reminder_days = request.form.get('reminder_days', type=int)
+    if reminder_days != service.reminder_days:
+        service.reminder_days = reminder_days
+        db.session.flush()
+        # Nowy interwał dotyczy też pojazdów obsłużonych wcześniej - przeliczamy tylko tę usługę
+        rebuild_service_due([service.id])
+    db.session.commit()
+    flash('Zaktualizowano cennik.')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/delete_service/<int:service_id>', methods=['POST'])
+@login_required
+def delete_service(service_id):
+    if current_user.role != 'owner': return "Brak dostępu", 403
+    service = Service.query.get_or_404(service_id)
+    ServiceDue.query.filter_by(service_id=service.id).delete()
+    db.session.delete(service)
+    db.session.commit()
+    flash('Usunięto usługę.')
+    return redirect(url_for('owner.owner_panel'))
+
+
+@bp.route('/owner/report_pdf')
+@login_required
+def owner_download_report():
+    if current_user.role != 'owner': return "Brak dostępu", 403
+
+    summaries = for_each_branch(finished_summary).values()
+    total_income = sum(summary[1] for summary in summaries)
+    parts_cost = sum(summary[2] for summary in summaries)
+    income_services = total_income - parts_cost
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    orders = for_each_branch(finished_orders)
+    etag = etag_for('raport', current_date, total_income, parts_cost,
+                    [(branch, [tuple(repair) for repair in repairs]) for branch, repairs in orders.items()])
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    from fpdf import FPDF  # ciężki import ładowany dopiero przy generowaniu PDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, f"RAPORT FINANSOWY: {current_date}", ln=1, align='C')
+    pdf.ln(10)
+
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 10, "Podsumowanie okresu:", ln=1)
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, f"PRZYCHOD: {total_income:.2f} PLN", ln=1)
+    pdf.set_font("Arial", '', 12)
+    pdf.cell(0, 10, f" - Czesci: {parts_cost:.2f} PLN", ln=1)
+    pdf.cell(0, 10, f" - Uslugi: {income_services:.2f} PLN", ln=1)
+    pdf.ln(10)
+
+    pdf.set_fill_color(200, 220, 255)
+    pdf.set_font("Arial", 'B', 10)
+    pdf.cell(20, 10, "ID", 1, 0, 'C', True)
+    pdf.cell(30, 10, "Data", 1, 0, 'C', True)
+    pdf.cell(90, 10, "Pojazd", 1, 0, 'C', True)
+    pdf.cell(50, 10, "Kwota", 1, 1, 'C', True)
+
+    pdf.set_font("Arial", '', 10)
+    for branch, repairs in orders.items():
+        for repair in repairs:
+            pdf.cell(20, 10, f"{branch}/{repair.id}" if branch else str(repair.id), 1)
+            pdf.cell(30, 10, repair.start_date.strftime('%Y-%m-%d'), 1)
+            pdf.cell(90, 10, f"{repair.make} {repair.model}", 1)
+            pdf.cell(50, 10, f"{repair.grand_total:.2f}", 1, 1)
+
+    return pdf_response(pdf.output(dest='S').encode('latin-1', 'replace'), f'Raport_{current_date}.pdf', etag)
@@ -0,0 +1,304 @@
+import asyncio
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask_login import login_required, current_user
+from ..loading import load_profile
+from ..parallel import run_query
+from sqlalchemy import case, delete, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from ..concurrency import conflict_response, is_stale
+from ..models import (User, Vehicle, RepairOrder, RepairPart, RepairService, Notification, db, Service,
+                      REPAIR_STATUSES, FINISHED_STATUSES)
+from ..notifications import queue_status_notification
+from ..reminders import forget_services_done, record_services_done
+from ..stock import release_reservations
+
+
+bp = Blueprint('reception', __name__)
+
+@bp.route('/panel/reception')
+@login_required
+async def reception_panel():
+    if current_user.role != 'reception': return redirect(url_for('main.dashboard'))
+    # Lista niesie tylko dane wierszy - formularz edycji przychodzi z edit_repair_form przy otwarciu modala
+    list_profile = load_profile('list')
+    repairs, mechanics = await asyncio.gather(
+        run_query(lambda s: s.query(RepairOrder).options(*list_profile).order_by(RepairOrder.start_date.desc()).all()),
+        run_query(lambda s: s.query(User).filter_by(role='mechanic').all()),
+    )
+    return render_template('reception_panel.html', repairs=repairs, mechanics=mechanics, statuses=REPAIR_STATUSES,
+                           user=current_user)
+
+
+@bp.route('/reception/repair/<int:repair_id>/edit_form')
+@login_required
+async def edit_repair_form(repair_id):
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    list_profile = load_profile('list')
+    repair, mechanics, services = await asyncio.gather(
+        run_query(lambda s: s.get(RepairOrder, repair_id, options=list_profile)),
+        run_query(lambda s: s.query(User).filter_by(role='mechanic').all()),
+        run_query(lambda s: s.query(Service).all()),
+    )
+    if repair is None: return "Nie znaleziono zlecenia", 404
+    return render_template('reception_edit_form.html', repair=repair, mechanics=mechanics, services=services)
+
+
+@bp.route('/reception/create_order', methods=['GET', 'POST'])
+@login_required
+async def reception_create_order():
+    if current_user.role != 'reception': return redirect(url_for('main.dashboard'))
+
+    if request.method == 'POST':
+        vehicle_id = request.form.get('vehicle_id')
+        service_id = request.form.get('service_id')
+        mechanic_id = request.form.get('mechanic_id')
+        description = request.form.get('description')
+        date_str = request.form.get('date')
+        time_str = request.form.get('time')
+
+        if vehicle_id and service_id:
+            start_date_obj = datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
+            new_repair = RepairOrder(
+                description=description, status='Zgłoszone',
+                start_date=start_date_obj, vehicle_id=vehicle_id
+            )
+            if mechanic_id:
+                new_repair.mechanic_id = mechanic_id
+                new_repair.status = 'Przyjęte do realizacji'
+
+            new_repair.add_service(Service.query.get(service_id))
+            db.session.add(new_repair)
+            db.session.commit()
+            flash(f'Zapisano zlecenie #{new_repair.id}.')
+            return redirect(url_for('reception.reception_panel'))
+
+    vehicles, services, mechanics, clients = await asyncio.gather(
+        run_query(lambda s: s.query(Vehicle).options(joinedload(Vehicle.owner)).all()),
+        run_query(lambda s: s.query(Service).all()),
+        run_query(lambda s: s.query(User).filter_by(role='mechanic').all()),
+        run_query(lambda s: s.query(User).filter_by(role='client').all()),
+    )
+    return render_template('reception_create_order.html', vehicles=vehicles, services=services,
+                           mechanics=mechanics, clients=clients, now=datetime.now())
+
+
+@bp.route('/reception/quick_add_vehicle', methods=['POST'])
+@login_required
+def quick_add_vehicle():
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+
+    registration_number = request.form.get('registration_number')
+    if Vehicle.query.filter_by(registration_number=registration_number).first():
+        flash('Auto o takiej rejestracji już istnieje!', 'error')
+    else:
+        new_car = Vehicle(
+            make=request.form.get('make'), model=request.form.get('model'),
+            registration_number=registration_number, vin=request.form.get('vin'),
+            owner_id=request.form.get('owner_id')
+        )
+        db.session.add(new_car)
+        db.session.commit()
+        flash(f'Dodano pojazd: {new_car.make} {new_car.model}')
+    return redirect(url_for('reception.reception_create_order'))
+
+
+@bp.route('/assign_mechanic/<int:repair_id>', methods=['POST'])
+@login_required
+def assign_mechanic(repair_id):
+    if current_user.role != 'reception': return redirect(url_for('main.dashboard'))
+    repair = RepairOrder.query.get_or_404(repair_id)
+    if is_stale(repair):
+        return conflict_response(repair, 'reception.reception_panel')
+    mechanic_id = request.form.get('mechanic_id')
+
+    if mechanic_id:
+        repair.mechanic_id = mechanic_id
+        repair.status = 'Przyjęte do realizacji'
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return conflict_response(repair, 'reception.reception_panel')
+        flash(f'Przypisano mechanika do zlecenia #{repair.id}.')
+    return redirect(url_for('reception.reception_panel'))
+
+
+@bp.route('/appointment/delete/<int:repair_id>', methods=['POST'])
+@login_required
+def delete_appointment(repair_id):
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    repair = RepairOrder.query.get_or_404(repair_id)
+    if is_stale(repair):
+        return conflict_response(repair, 'reception.reception_panel')
+    release_reservations([repair.id])
+    # Przypomnienia o terminach zostają w outboxie - dotyczą pojazdu, nie tego zlecenia
+    Notification.query.filter_by(repair_id=repair.id, kind='status').delete()
+    db.session.delete(repair)
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        # Zlecenie zmienione w międzyczasie - nie usuwamy na podstawie starego stanu
+        repair = db.session.get(RepairOrder, repair_id)
+        if repair is not None:
+            return conflict_response(repair, 'reception.reception_panel')
+    flash('Rezerwacja została usunięta.')
+    return redirect(url_for('reception.reception_panel'))
+
+
+@bp.route('/repair/edit/<int:repair_id>', methods=['POST'])
+@login_required
+def edit_repair(repair_id):
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    repair = RepairOrder.query.options(*load_profile('edit')).filter_by(id=repair_id).first_or_404()
+    if is_stale(repair):
+        return conflict_response(repair, 'reception.reception_panel')
+
+    new_date = request.form.get('date')
+    new_time = request.form.get('time')
+    new_status = request.form.get('status')
+    description = request.form.get('description')
+    mechanic_id = request.form.get('mechanic_id')
+    service_id = request.form.get('service_id')
+    old_status = repair.status
+
+    if new_date and new_time:
+        repair.start_date = datetime.strptime(f"{new_date} {new_time}", '%Y-%m-%d %H:%M')
+
+    if new_status:
+        repair.status = new_status
+        if new_status == 'Gotowe': repair.end_date = datetime.now()
+
+    if description: repair.description = description
+
+    if mechanic_id:
+        repair.mechanic_id = mechanic_id
+        if repair.status == 'Zgłoszone': repair.status = 'Przyjęte do realizacji'
+    elif mechanic_id == "":
+        repair.mechanic_id = None
+
+    if service_id:
+        repair.replace_service(Service.query.get(service_id))
+    queue_status_notification(repair, old_status)
+
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return conflict_response(repair, 'reception.reception_panel')
+    flash(f'Zaktualizowano dane zlecenia #{repair.id}.')
+    return redirect(url_for('reception.reception_panel'))
+
+
+# OPERACJE ZBIORCZE - jedna transakcja i jeden UPDATE/DELETE dla wszystkich zaznaczonych zleceń
+
+def batch_report(requested, results):
+    db.session.commit()
+    return jsonify({
+        'updated': sum(1 for result in results.values() if result == 'ok'),
+        'results': [{'id': repair_id, 'result': results[repair_id]} for repair_id in requested],
+    })
+
+
+def batch_targets():
+    requested = list(dict.fromkeys(request.form.getlist('repair_ids', type=int)))
+    found = {row.id for row in db.session.query(RepairOrder.id).filter(RepairOrder.id.in_(requested))}
+    results = {repair_id: 'ok' if repair_id in found else 'not_found' for repair_id in requested}
+    return requested, results
+
+
+def ok_ids(results):
+    return [repair_id for repair_id, result in results.items() if result == 'ok']
+
+
+@bp.route('/reception/batch/assign', methods=['POST'])
+@login_required
+def batch_assign_mechanic():
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    mechanic = User.query.filter_by(id=request.form.get('mechanic_id', type=int), role='mechanic').first()
+    if not mechanic: return jsonify({'error': 'Nieznany mechanik'}), 400
+
+    requested, results = batch_targets()
+    # Zakończonych zleceń nie otwieramy ponownie; status zmienia się tylko przy nowym zgłoszeniu, jak w edit_repair
+    finished = {row.id for row in db.session.query(RepairOrder.id)
+                .filter(RepairOrder.id.in_(ok_ids(results)), RepairOrder.status.in_(FINISHED_STATUSES))}
+    for repair_id in finished:
+        results[repair_id] = 'finished'
+
+    accepted = case((RepairOrder.status == 'Zgłoszone', 'Przyjęte do realizacji'), else_=RepairOrder.status)
+    db.session.execute(update(RepairOrder)
+                       .where(RepairOrder.id.in_(ok_ids(results)), RepairOrder.status.not_in(FINISHED_STATUSES))
+                       .values(mechanic_id=mechanic.id, status=accepted, version=RepairOrder.version + 1))
+    return batch_report(requested, results)
+
+
+@bp.route('/reception/batch/status', methods=['POST'])
+@login_required
+def batch_change_status():
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    new_status = request.form.get('status')
+    if new_status not in REPAIR_STATUSES: return jsonify({'error': 'Nieznany status'}), 400
+
+    requested, results = batch_targets()
+    changing = RepairOrder.query.options(*load_profile('edit')) \
+        .filter(RepairOrder.id.in_(ok_ids(results)), RepairOrder.status != new_status).all()
+    old_statuses = {repair.id: repair.status for repair in changing}
+    values = {'status': new_status, 'version': RepairOrder.version + 1}
+    if new_status == 'Gotowe': values['end_date'] = datetime.now()
+    db.session.execute(update(RepairOrder).where(RepairOrder.id.in_(ok_ids(results))).values(**values))
+    if new_status in FINISHED_STATUSES:
+        # Zbiorczy UPDATE omija zdarzenia sesji - rezerwacje i terminy usług aktualizujemy jawnie
+        release_reservations([repair.id for repair in changing])
+    if new_status == 'Gotowe':
+        record_services_done(changing)
+    else:
+        forget_services_done([repair.id for repair in changing if old_statuses[repair.id] == 'Gotowe'])
+    for repair in changing:
+        queue_status_notification(repair, old_statuses[repair.id])
+    return batch_report(requested, results)
+
+
+@bp.route('/reception/batch/reschedule', methods=['POST'])
+@login_required
+def batch_reschedule():
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    try:
+        start_date = datetime.strptime(f"{request.form.get('date')} {request.form.get('time')}", '%Y-%m-%d %H:%M')
+    except ValueError:
+        return jsonify({'error': 'Nieprawidłowy termin'}), 400
+
+    requested, results = batch_targets()
+    # Termin zakończonego zlecenia to już historia (raporty, przypomnienia) - nie przesuwamy go
+    finished = {row.id for row in db.session.query(RepairOrder.id)
+                .filter(RepairOrder.id.in_(ok_ids(results)), RepairOrder.status.in_(FINISHED_STATUSES))}
+    for repair_id in finished:
+        results[repair_id] = 'finished'
+
+    db.session.execute(update(RepairOrder)
+                       .where(RepairOrder.id.in_(ok_ids(results)), RepairOrder.status.not_in(FINISHED_STATUSES))
+                       .values(start_date=start_date, version=RepairOrder.version + 1))
+    return batch_report(requested, results)
+
+
+@bp.route('/reception/batch/delete', methods=['POST'])
+@login_required
+def batch_delete():
+    if current_user.role != 'reception': return "Brak uprawnień", 403
+    requested, results = batch_targets()
+
+    # Zlecenia z wydanymi częściami zostają - ich historia magazynowa musi się zgadzać
+    with_parts = {row.repair_id for row in db.session.query(RepairPart.repair_id)
+                  .filter(RepairPart.repair_id.in_(ok_ids(results))).distinct()}
+    for repair_id in with_parts:
+        results[repair_id] = 'has_parts'
+
+    to_delete = ok_ids(results)
+    db.session.execute(delete(RepairService).where(RepairService.repair_id.in_(to_delete)))
+    db.session.execute(delete(Notification).where(Notification.repair_id.in_(to_delete),
+                                                  Notification.kind == 'status'))
+    release_reservations(to_delete)
+    forget_services_done(to_delete)
+    db.session.execute(delete(RepairOrder).where(RepairOrder.id.in_(to_delete)))
+    return batch_report(requested, results)
@@ -0,0 +1,18 @@
+import asyncio
+
+from . import db
+
+
+def _run_in_own_session(query):
+    # Osobna sesja = osobne połączenie, oddawane do puli zaraz po zapytaniu. Wynik ma już wszystko, czego potrzebuje
+    # szablon (opcje ładowania w zapytaniu) - relacje i tak nie doładowują się same (lazy='raise_on_sql')
+    with db.session.session_factory() as session:
+        return query(session)
+
+
+async def run_query(query):
+    """Wykonuje query(session) w wątku roboczym z własną sesją, żeby kilka zapytań szło równolegle.
+
+    Zwrócone obiekty są odłączone od sesji - ich relacje trzeba załadować w samym zapytaniu.
+    """
+    return await asyncio.to_thread(_run_in_own_session, query)
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, func, insert, inspect, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from . import db
+from .models import RepairOrder, RepairService, Service, ServiceDue, Vehicle
+
+DEFAULT_LEAD_DAYS = 14
+
+REMINDER_MESSAGE = (
+    'Zbliża się termin: {service} ({registration})',
+    'Dzień dobry,\n\nostatnia usługa "{service}" w pojeździe {make} {model} ({registration}) była wykonana '
+    '{done:%d.%m.%Y}. Kolejny termin przypada {due:%d.%m.%Y}.\n\nWizytę można umówić tutaj: {link}\n\nWarsztat',
+)
+
+
+def lead_days():
+    return current_app.config['REMINDER_LEAD_DAYS'] if has_app_context() else DEFAULT_LEAD_DAYS
+
+
+def due_dates(done_at, reminder_days, lead):
+    next_due = done_at + timedelta(days=reminder_days)
+    return next_due, next_due - timedelta(days=lead)
+
+
+def record_services_done(repairs, session=None):
+    """Przesuwa terminy usług z zakończonych zleceń - tylko wiersze tych pojazdów, bez czytania historii."""
+    session = session or db.session
+    repairs = {repair.id: repair for repair in repairs}
+    if not repairs:
+        return
+    done = session.execute(
+        select(RepairService.repair_id, RepairService.service_id, Service.reminder_days)
+        .join(Service, Service.id == RepairService.service_id)
+        .where(RepairService.repair_id.in_(repairs), Service.reminder_days.is_not(None))
+    ).all()
+    lead = lead_days()
+    for repair_id, service_id, reminder_days in done:
+        repair = repairs[repair_id]
+        done_at = repair.end_date or datetime.now()
+        due = session.get(ServiceDue, (repair.vehicle_id, service_id))
+        if due is None:
+            due = ServiceDue(vehicle_id=repair.vehicle_id, service_id=service_id)
+            session.add(due)
+        elif due.last_done_at >= done_at:
+            continue
+        due.last_repair_id, due.last_done_at = repair_id, done_at
+        due.next_due, due.remind_at = due_dates(done_at, reminder_days, lead)
+
+
+def rebuild_service_due(service_ids=None, now=None, pairs=None, skip_repairs=(), session=None):
+    """Przelicza projekcję z historii zakończonych zleceń: start na istniejącej bazie albo po zmianie interwału.
+
+    pairs zawęża przeliczenie do par (pojazd, usługa), skip_repairs pomija zlecenia, których usunięcie
+    albo ponowne otwarcie nie jest jeszcze zapisane w bazie.
+    Terminy, które minęły już przed przeliczeniem, nie dostają przypomnienia - nie wysyłamy zaległych hurtem.
+    """
+    session = session or db.session
+    now = now or datetime.now()
+    done_at = func.max(func.coalesce(RepairOrder.end_date, RepairOrder.start_date))
+    history = select(RepairOrder.vehicle_id, RepairService.service_id, Service.reminder_days,
+                     done_at, func.max(RepairOrder.id)) \
+        .join(RepairService, RepairService.repair_id == RepairOrder.id) \
+        .join(Service, Service.id == RepairService.service_id) \
+        .where(RepairOrder.status == 'Gotowe', Service.reminder_days.is_not(None)) \
+        .group_by(RepairOrder.vehicle_id, RepairService.service_id, Service.reminder_days)
+    clear = delete(ServiceDue)
+    if service_ids is not None:
+        history = history.where(RepairService.service_id.in_(service_ids))
+        clear = clear.where(ServiceDue.service_id.in_(service_ids))
+    if pairs is not None:
+        history = history.where(tuple_(RepairOrder.vehicle_id, RepairService.service_id).in_(pairs))
+        clear = clear.where(tuple_(ServiceDue.vehicle_id, ServiceDue.service_id).in_(pairs))
+    if skip_repairs:
+        history = history.where(RepairOrder.id.not_in(skip_repairs))
+
+    lead = lead_days()
+    rows = []
+    for vehicle_id, service_id, reminder_days, last_done_at, last_repair_id in session.execute(history):
+        next_due, remind_at = due_dates(last_done_at, reminder_days, lead)
+        rows.append({'vehicle_id': vehicle_id, 'service_id': service_id, 'last_repair_id': last_repair_id,
+                     'last_done_at': last_done_at, 'next_due': next_due,
+                     'remind_at': remind_at if next_due >= now else None})
+    session.execute(clear)
+    if rows:
+        session.execute(insert(ServiceDue), rows)
+    return len(rows)
+
+
+def forget_services_done(repair_ids, session=None):
+    """Cofa terminy liczone od zleceń, które przestały być zakończone (usunięte albo otwarte ponownie).
+
+    Dotyczy tylko wierszy wskazujących na te zlecenia - ich pary przelicza się z pozostałej historii.
+    """
+    session = session or db.session
+    if not repair_ids:
+        return
+    pairs = session.execute(select(ServiceDue.vehicle_id, ServiceDue.service_id)
+                            .where(ServiceDue.last_repair_id.in_(repair_ids))).all()
+    if pairs:
+        rebuild_service_due(pairs=[tuple(pair) for pair in pairs], skip_repairs=list(repair_ids), session=session)
+
+
+def booking_link(due):
+    query = urlencode({'vehicle_id': due.vehicle_id, 'service_id': due.service_id})
+    return f"{current_app.config['PUBLIC_URL'].rstrip('/')}/book_appointment?{query}"
+
+
+def queue_due_reminders(now=None, batch_size=500):
+    """Przypomnienia dla terminów z remind_at <= teraz (zakres po indeksie); zwraca liczbę pojazdów."""
+    from .notifications import queue_notification
+
+    now = now or datetime.now()
+    queued = 0
+    while True:
+        batch = ServiceDue.query.options(joinedload(ServiceDue.vehicle).joinedload(Vehicle.owner),
+                                         joinedload(ServiceDue.service)) \
+            .filter(ServiceDue.remind_at <= now).order_by(ServiceDue.remind_at).limit(batch_size).all()
+        if not batch:
+            return queued
+        for due in batch:
+            vehicle = due.vehicle
+            fields = {'service': due.service.name, 'make': vehicle.make, 'model': vehicle.model,
+                      'registration': vehicle.registration_number, 'done': due.last_done_at,
+                      'due': due.next_due, 'link': booking_link(due)}
+            subject, body = (text.format(**fields) for text in REMINDER_MESSAGE)
+            queue_notification(due.last_repair_id, vehicle.owner, subject, body, kind='reminder')
+            due.remind_at = None
+        # Paczka razem z wierszami outboxu w jednym commicie - przerwany job niczego nie wyśle dwa razy
+        db.session.commit()
+        queued += len(batch)
+
+
+def track_completions(session, flush_context, instances):
+    changed = [obj for obj in session.dirty
+               if isinstance(obj, RepairOrder) and inspect(obj).attrs.status.history.has_changes()]
+    completed = [repair for repair in changed if repair.status == 'Gotowe']
+    # Usunięte albo otwarte ponownie zakończone zlecenie nie może dalej wyznaczać terminu
+    undone = [repair.id for repair in session.deleted if isinstance(repair, RepairOrder)]
+    undone += [repair.id for repair in changed
+               if repair.status != 'Gotowe' and 'Gotowe' in inspect(repair).attrs.status.history.deleted]
+    if completed or undone:
+        with session.no_autoflush:
+            forget_services_done(undone, session)
+            record_services_done(completed, session)
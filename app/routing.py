@@ -0,0 +1,48 @@
+import time
+
+from flask import current_app, has_request_context, request, session
+from sqlalchemy import create_engine
+
+from .branches import BranchSession, branch_engines, current_branch
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def init_read_replicas(app, db):
+    """Tworzy silniki tylko do odczytu: repliki z READ_REPLICAS lub połączenia WAL do plików SQLite."""
+    replicas = {code: create_engine(uri) for code, uri in app.config['READ_REPLICAS'].items()}
+
+    if app.config['SQLITE_WAL_READS']:
+        for code, engine in branch_engines().items():
+            database = engine.url.database
+            if code in replicas or engine.url.get_backend_name() != 'sqlite' or database in (None, '', ':memory:'):
+                continue
+            # Tryb WAL jest zapisywany w pliku bazy - czytelnicy nie blokują wtedy zapisującego
+            with engine.connect() as connection:
+                connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+            replicas[code] = create_engine(f"sqlite:///file:{database}?mode=ro&uri=true")
+
+    app.extensions['read_replicas'] = replicas
+
+    @app.after_request
+    def remember_write(response):
+        # Po POST kolejne odczyty idą do bazy głównej, żeby użytkownik zobaczył własne zmiany
+        if request.method not in READ_METHODS:
+            session['_read_primary_until'] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+        return response
+
+
+def reads_from_replica():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    return session.get('_read_primary_until', 0) < time.time()
+
+
+class RoutingSession(BranchSession):
+    # Widoki tylko do odczytu czytają z repliki, zapisy i flush zawsze trafiają do bazy głównej
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False) and reads_from_replica():
+            replica = current_app.extensions.get('read_replicas', {}).get(current_branch())
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
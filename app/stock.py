@@ -0,0 +1,87 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, inspect, select
+
+from . import db
+from .models import FINISHED_STATUSES, Part, RepairOrder, StockMovement, StockSnapshot
+
+StockLevel = namedtuple('StockLevel', 'on_hand reserved available')
+
+
+def record_movement(part, kind, on_hand=0, reserved=0, repair_id=None, session=None):
+    (session or db.session).add(StockMovement(part=part, kind=kind, on_hand_delta=on_hand, reserved_delta=reserved,
+                                              repair_id=repair_id))
+
+
+def stock_levels(part_ids=None, session=None, up_to=None):
+    """Stan, rezerwacje i dostępność części: snapshot + ruchy od snapshotu, bez przeliczania całej księgi."""
+    session = session or db.session
+    after_snapshot = StockMovement.id > func.coalesce(StockSnapshot.last_movement_id, 0)
+    deltas = select(StockMovement.part_id, func.sum(StockMovement.on_hand_delta),
+                    func.sum(StockMovement.reserved_delta)) \
+        .outerjoin(StockSnapshot, StockSnapshot.part_id == StockMovement.part_id) \
+        .where(after_snapshot).group_by(StockMovement.part_id)
+    bases = select(Part.id, func.coalesce(StockSnapshot.on_hand, 0), func.coalesce(StockSnapshot.reserved, 0)) \
+        .outerjoin(StockSnapshot, StockSnapshot.part_id == Part.id)
+    if part_ids is not None:
+        deltas = deltas.where(StockMovement.part_id.in_(part_ids))
+        bases = bases.where(Part.id.in_(part_ids))
+    if up_to is not None:
+        deltas = deltas.where(StockMovement.id <= up_to)
+
+    changes = {part_id: (on_hand, reserved) for part_id, on_hand, reserved in session.execute(deltas)}
+    levels = {}
+    for part_id, on_hand, reserved in session.execute(bases):
+        on_hand_delta, reserved_delta = changes.get(part_id, (0, 0))
+        on_hand, reserved = on_hand + on_hand_delta, reserved + reserved_delta
+        levels[part_id] = StockLevel(on_hand, reserved, on_hand - reserved)
+    return levels
+
+
+def reservations(repair_ids, session=None):
+    """Niezwolnione rezerwacje zleceń: [(repair_id, part_id, ilość)]."""
+    session = session or db.session
+    return session.execute(
+        select(StockMovement.repair_id, StockMovement.part_id, func.sum(StockMovement.reserved_delta))
+        .where(StockMovement.repair_id.in_(repair_ids))
+        .group_by(StockMovement.repair_id, StockMovement.part_id)
+        .having(func.sum(StockMovement.reserved_delta) > 0)
+    ).all()
+
+
+def release_reservations(repair_ids, session=None):
+    session = session or db.session
+    for repair_id, part_id, quantity in reservations(repair_ids, session):
+        session.add(StockMovement(part_id=part_id, kind='release', reserved_delta=-quantity, repair_id=repair_id))
+
+
+def take_snapshots(now=None):
+    """Zapisuje bieżące stany jako nowy punkt odniesienia; zwraca części, których licznik nie zgadza się z księgą."""
+    last_id = db.session.scalar(select(func.max(StockMovement.id))) or 0
+    levels = stock_levels(up_to=last_id)
+    db.session.execute(delete(StockSnapshot))
+    if levels:
+        db.session.execute(insert(StockSnapshot), [
+            {'part_id': part_id, 'last_movement_id': last_id, 'on_hand': level.on_hand,
+             'reserved': level.reserved, 'taken_at': now or datetime.now()}
+            for part_id, level in levels.items()
+        ])
+    counters = dict(db.session.execute(select(Part.id, Part.stock_quantity)).all())
+    db.session.commit()
+    return {part_id: (counters[part_id], level.on_hand) for part_id, level in levels.items()
+            if (counters[part_id] or 0) != level.on_hand}
+
+
+def keep_ledger(session, flush_context, instances):
+    # Księga uzupełnia się sama: bilans otwarcia nowych części i zwolnienie rezerwacji zamkniętych zleceń
+    for obj in list(session.new):
+        if isinstance(obj, Part) and obj.stock_quantity:
+            record_movement(obj, 'adjustment', on_hand=obj.stock_quantity, session=session)
+
+    closed = [obj.id for obj in session.dirty
+              if isinstance(obj, RepairOrder) and obj.status in FINISHED_STATUSES
+              and inspect(obj).attrs.status.history.has_changes()]
+    if closed:
+        with session.no_autoflush:
+            release_reservations(closed, session)
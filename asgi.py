@@ -0,0 +1,7 @@
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+
+# Serwer ASGI, np.: uvicorn asgi:app
+# Workery startują bez sprawdzania schematu (FAST_START) - przy wdrożeniu najpierw `flask init-db`
+app = WsgiToAsgi(create_app({'FAST_START': True}))
@@ -0,0 +1,96 @@
+"""Zestawienia analityki: snapshot kolumnowy kontra GROUP BY na tabelach zleceń.
+
+Wypełnia bazę zakończonymi zleceniami, mierzy czas zbudowania snapshotu, odczytu pliku i wszystkich
+zestawień widoku z NumPy, a dla porównania te same grupowania liczone zapytaniami SQL przy każdym żądaniu.
+Uruchomienie: python -m benchmarks.analytics
+"""
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, insert, select
+
+from app import create_app, db
+from app.analytics import build_snapshot, load_snapshot, save_snapshot, summarize
+from app.models import RepairOrder, RepairService, Service, User, Vehicle
+
+ORDERS = 50000
+MECHANICS = 12
+VEHICLES = 5000
+MODELS = [('Fiat', 'Panda'), ('Skoda', 'Octavia'), ('Toyota', 'Corolla'), ('VW', 'Golf'), ('Opel', 'Astra')]
+REPEATS = 10
+
+
+def seed(app):
+    rng = random.Random(7)
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'email': f'm{i}@bench.pl', 'password': 'x', 'first_name': f'Mechanik{i}', 'last_name': 'B',
+             'role': 'mechanic'} for i in range(MECHANICS)] + [
+            {'email': 'klient@bench.pl', 'password': 'x', 'first_name': 'K', 'last_name': 'B', 'role': 'client'}])
+        db.session.execute(insert(Service), [{'name': f'Usługa {i}', 'base_price': 100.0 + 50 * i} for i in range(8)])
+        db.session.execute(insert(Vehicle), [
+            {'make': make, 'model': model, 'registration_number': f'BN{i:05d}', 'owner_id': MECHANICS + 1}
+            for i, (make, model) in enumerate(rng.choice(MODELS) for _ in range(VEHICLES))])
+        orders, links = [], []
+        for order_id in range(1, ORDERS + 1):
+            start = datetime(2025, 1, 1) + timedelta(hours=rng.randrange(365 * 24))
+            service_ids = rng.sample(range(1, 9), rng.randint(1, 3))
+            total = sum(100.0 + 50 * (i - 1) for i in service_ids)
+            orders.append({'id': order_id, 'description': 'x', 'status': 'Gotowe', 'start_date': start,
+                           'end_date': start + timedelta(hours=rng.uniform(1, 72)),
+                           'vehicle_id': rng.randint(1, VEHICLES), 'mechanic_id': rng.randint(1, MECHANICS),
+                           'services_total': total, 'grand_total': total})
+            links += [{'repair_id': order_id, 'service_id': i, 'name': f'Usługa {i - 1}',
+                       'price': 100.0 + 50 * (i - 1)} for i in service_ids]
+        db.session.execute(insert(RepairOrder), orders)
+        db.session.execute(insert(RepairService), links)
+        db.session.commit()
+
+
+def sql_report():
+    """Te same grupowania co widok, liczone przez bazę przy każdym żądaniu."""
+    hours = (func.julianday(RepairOrder.end_date) - func.julianday(RepairOrder.start_date)) * 24
+    finished = RepairOrder.status == 'Gotowe'
+    queries = [
+        select(RepairOrder.mechanic_id, func.count(), func.sum(RepairOrder.grand_total), func.avg(hours))
+        .where(finished).group_by(RepairOrder.mechanic_id),
+        select(Vehicle.make, Vehicle.model, func.count(), func.sum(RepairOrder.grand_total), func.avg(hours))
+        .join(Vehicle, Vehicle.id == RepairOrder.vehicle_id).where(finished).group_by(Vehicle.make, Vehicle.model),
+        select(RepairService.name, func.count(), func.sum(RepairService.price), func.avg(hours))
+        .join(RepairOrder, RepairOrder.id == RepairService.repair_id).where(finished).group_by(RepairService.name),
+        select(func.strftime('%Y-%m', RepairOrder.end_date), func.count(), func.sum(RepairOrder.grand_total))
+        .where(finished).group_by(func.strftime('%Y-%m', RepairOrder.end_date)),
+    ]
+    return [db.session.execute(query).all() for query in queries]
+
+
+def timed(action, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = action()
+    return result, (time.perf_counter() - start) / repeats * 1000
+
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(tmp) / 'bench.db'}"})
+        seed(app)
+        path = Path(tmp) / 'analytics.npz'
+        with app.app_context():
+            snapshot, build_ms = timed(build_snapshot, repeats=1)
+            save_snapshot(snapshot, path)
+            print(f"{ORDERS} zleceń: budowa snapshotu {build_ms:7.1f} ms, plik {path.stat().st_size / 1024:.0f} KiB")
+            _, load_ms = timed(lambda: load_snapshot(path), repeats=1)
+            _, cached_ms = timed(lambda: load_snapshot(path))
+            print(f"  odczyt pliku {load_ms:7.2f} ms, z pamięci {cached_ms:7.3f} ms")
+            _, numpy_ms = timed(lambda: summarize(load_snapshot(path)))
+            _, sql_ms = timed(sql_report)
+            print(f"  zestawienia widoku: NumPy {numpy_ms:7.2f} ms, GROUP BY w SQLite {sql_ms:7.1f} ms")
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,79 @@
+"""Wpływ kopii zapasowej na opóźnienie zapisów.
+
+Jeden wątek zapisuje małe transakcje (jak wydanie części), drugi w tym czasie robi kopie bazy:
+w jednym kroku (pages=-1) albo krokami po BACKUP_PAGES stron z przerwą. Porównanie dla trybu
+dziennika DELETE (domyślny) i WAL (SQLITE_WAL_READS).
+Uruchomienie: python -m benchmarks.backup
+"""
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.backup import copy_online
+
+FILLER_ROWS = 40000  # ok. 40 MB bazy
+DURATION = 3.0
+PAGES = 256
+SLEEP = 0.005
+
+
+def build_database(path, journal_mode):
+    connection = sqlite3.connect(path)
+    connection.execute(f'PRAGMA journal_mode={journal_mode}')
+    connection.execute('CREATE TABLE filler (id INTEGER PRIMARY KEY, body TEXT)')
+    connection.execute('CREATE TABLE stock_movement (id INTEGER PRIMARY KEY, part_id INTEGER, on_hand_delta INTEGER)')
+    connection.executemany('INSERT INTO filler (body) VALUES (?)', (('x' * 1000,) for _ in range(FILLER_ROWS)))
+    connection.commit()
+    connection.close()
+
+
+def measure(path, backup_pages):
+    """Opóźnienia zapisów (ms) i liczba kopii wykonanych w tle w czasie DURATION."""
+    stop = threading.Event()
+    backups, restarts = [0], [0]
+
+    def backup_loop(target_dir):
+        while not stop.is_set():
+            restarts[0] += copy_online(path, Path(target_dir) / 'kopia.db', backup_pages, SLEEP)
+            backups[0] += 1
+
+    latencies = []
+    writer = sqlite3.connect(path, timeout=30)
+    with tempfile.TemporaryDirectory() as target_dir:
+        thread = threading.Thread(target=backup_loop, args=(target_dir,)) if backup_pages is not None else None
+        if thread:
+            thread.start()
+        end = time.perf_counter() + DURATION
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            writer.execute('INSERT INTO stock_movement (part_id, on_hand_delta) VALUES (1, -1)')
+            writer.commit()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.002)
+        stop.set()
+        if thread:
+            thread.join()
+    writer.close()
+    return latencies, backups[0], restarts[0]
+
+
+def run_benchmark():
+    for journal_mode in ('delete', 'wal'):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'bench.db'
+            build_database(path, journal_mode)
+            size = path.stat().st_size / 1024 / 1024
+            print(f"tryb dziennika {journal_mode.upper()}, baza {size:.0f} MB")
+            for label, pages in [('bez kopii', None), ('kopia w jednym kroku', -1), (f'kopia po {PAGES} stron', PAGES)]:
+                latencies, backups, restarts = measure(path, pages)
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(f"  {label:22s} zapisy: {len(latencies):5d}  p50: {quantiles[49]:6.2f} ms  "
+                      f"p99: {quantiles[98]:7.2f} ms  max: {max(latencies):7.2f} ms  "
+                      f"kopie: {backups}  restarty: {restarts}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
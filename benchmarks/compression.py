@@ -0,0 +1,87 @@
+"""Oszczędność bajtów i koszt CPU kompresji odpowiedzi paneli oraz faktury PDF.
+
+Mierzy rozmiar panelu recepcji bez kompresji, z gzip (różne poziomy) i z brotli (jeśli zainstalowany),
+czas CPU samej kompresji oraz zysk z rewalidacji faktury przez ETag (304 zamiast generowania PDF).
+Uruchomienie: python -m benchmarks.compression
+"""
+import gzip
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.http_cache import BROTLI_QUALITY, brotli
+from app.models import RepairOrder, Service, User, Vehicle
+
+ORDERS = 300
+REPEATS = 20
+
+
+def seed(app):
+    with app.app_context():
+        password = generate_password_hash('haslo')
+        reception = User(email='recepcja@bench.pl', password=password, first_name='R', last_name='B', role='reception')
+        client = User(email='klient@bench.pl', password=password, first_name='K', last_name='B', role='client')
+        service = Service(name='Przeglad okresowy', base_price=150.0)  # FPDF 1.7 pisze tylko latin-1
+        db.session.add_all([reception, client, service])
+        db.session.commit()
+        for i in range(ORDERS):
+            car = Vehicle(make='Fiat', model='Panda', registration_number=f'BN{i:05d}', owner_id=client.id)
+            order = RepairOrder(description=f'Stuki w zawieszeniu, zlecenie {i}', vehicle=car, status='Gotowe',
+                                start_date=datetime(2026, 1, 1, 8))
+            order.add_service(service)
+            db.session.add(order)
+        db.session.commit()
+
+
+def cpu_ms(compress, data):
+    start = time.process_time()
+    for _ in range(REPEATS):
+        compress(data)
+    return (time.process_time() - start) / REPEATS * 1000
+
+
+def timed_get(client, url, headers, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        response = client.get(url, headers=headers)
+    return response, (time.perf_counter() - start) / repeats * 1000
+
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(tmp) / 'bench.db'}"})
+        seed(app)
+        client = app.test_client()
+        client.post('/login', data={'email': 'recepcja@bench.pl', 'password': 'haslo'})
+
+        html = client.get('/panel/reception').data
+        print(f"panel recepcji ({ORDERS} zleceń): {len(html) / 1024:8.1f} KiB bez kompresji")
+        variants = [(f'gzip -{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0))
+                    for level in (1, 6, 9)]
+        if brotli is not None:
+            variants.append((f'brotli q{BROTLI_QUALITY}', lambda data: brotli.compress(data, quality=BROTLI_QUALITY)))
+        else:
+            print("(brotli nie jest zainstalowany - pomijam)")
+        for label, compress in variants:
+            size = len(compress(html))
+            print(f"  {label:12s} {size / 1024:8.1f} KiB  ({100 * (1 - size / len(html)):5.1f}% mniej)  "
+                  f"CPU: {cpu_ms(compress, html):6.2f} ms")
+
+        _, plain_ms = timed_get(client, '/panel/reception', {})
+        _, packed_ms = timed_get(client, '/panel/reception', {'Accept-Encoding': 'gzip'})
+        print(f"czas żądania panelu: bez kompresji {plain_ms:6.1f} ms, z gzip {packed_ms:6.1f} ms")
+
+        invoice, full_ms = timed_get(client, '/history/1/invoice', {})
+        _, revalidate_ms = timed_get(client, '/history/1/invoice', {'If-None-Match': invoice.headers['ETag']})
+        print(f"faktura PDF: {len(invoice.data) / 1024:.1f} KiB, generowanie {full_ms:6.1f} ms, "
+              f"rewalidacja 304 {revalidate_ms:6.1f} ms")
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
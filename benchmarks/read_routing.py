@@ -0,0 +1,92 @@
+"""Przepustowość odczytów paneli przy mieszanym obciążeniu (odczyty + zapisy).
+
+Porównuje jedną bazę SQLite z trybem SQLITE_WAL_READS (osobna pula połączeń tylko do odczytu).
+Uruchomienie: python -m benchmarks.read_routing
+"""
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import RepairOrder, Service, User, Vehicle
+
+READERS = 4
+DURATION = 5.0
+ORDERS = 50
+
+
+def seed(app):
+    with app.app_context():
+        password = generate_password_hash('haslo')
+        reception = User(email='recepcja@bench.pl', password=password, first_name='R', last_name='B', role='reception')
+        client = User(email='klient@bench.pl', password=password, first_name='K', last_name='B', role='client')
+        service = Service(name='Przegląd okresowy', base_price=150.0)
+        db.session.add_all([reception, client, service])
+        db.session.commit()
+        for i in range(ORDERS):
+            car = Vehicle(make='Fiat', model='Panda', registration_number=f'BN{i:05d}', owner_id=client.id)
+            order = RepairOrder(description='Benchmark', vehicle=car, start_date=datetime(2026, 1, 1, 8))
+            order.add_service(service)
+            db.session.add(order)
+        db.session.commit()
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'recepcja@bench.pl', 'password': 'haslo'})
+    return client
+
+
+def run_mixed_load(app):
+    stop = time.perf_counter() + DURATION
+    reads = [0] * READERS
+    writes = [0]
+    errors = [0]
+
+    def reader(index):
+        client = logged_in_client(app)
+        while time.perf_counter() < stop:
+            if client.get('/panel/reception').status_code >= 500:
+                errors[0] += 1
+            reads[index] += 1
+
+    def writer():
+        client = logged_in_client(app)
+        while time.perf_counter() < stop:
+            repair_id = writes[0] % ORDERS + 1
+            response = client.post(f'/repair/edit/{repair_id}', data={'description': f'Zmiana {writes[0]}'})
+            if response.status_code >= 500:
+                errors[0] += 1
+            writes[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / DURATION, writes[0] / DURATION, errors[0]
+
+
+def run_benchmark():
+    for label, wal_reads in [('jedna pula', False), ('WAL + pula tylko do odczytu', True)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(tmp) / 'bench.db'}",
+                'SQLITE_WAL_READS': wal_reads,
+            })
+            seed(app)
+            read_rate, write_rate, errors = run_mixed_load(app)
+            with app.app_context():
+                db.engine.dispose()
+                for replica in app.extensions['read_replicas'].values():
+                    replica.dispose()
+        print(f"{label:32s} odczyty: {read_rate:7.1f}/s  zapisy: {write_rate:6.1f}/s  błędy: {errors}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
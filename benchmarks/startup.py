@@ -0,0 +1,103 @@
+"""Czas zimnego startu: import pakietu, create_app i pierwsze żądanie.
+
+Bazy (główna i oddziały) są wypełnione danymi, jak w działającym warsztacie. Pełny start przy każdym
+uruchomieniu sprawdza schemat każdej bazy (create_all, odczyt kolumn i indeksów, bilans otwarcia księgi);
+FAST_START pomija ten krok, a schemat aktualizuje raz `flask init-db` przy wdrożeniu.
+Każdy pomiar startu w świeżym interpreterze, żeby importy nie były już w pamięci.
+Uruchomienie: python -m benchmarks.startup
+"""
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from app import create_app, create_schema, db
+from app.branches import use_branch
+from app.models import Part, RepairOrder, User, Vehicle
+
+RUNS = 5
+BRANCHES = 4
+VEHICLES = 5000
+ORDERS = 20000
+PARTS = 2000
+
+MEASURE = '''
+import time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app({config!r})
+t2 = time.perf_counter()
+app.test_client().get('/login')
+t3 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2)
+'''
+
+
+def seed():
+    db.session.execute(insert(User), [{'email': 'klient@bench.pl', 'password': 'x', 'first_name': 'K',
+                                       'last_name': 'B', 'role': 'client'}])
+    db.session.execute(insert(Vehicle), [{'make': 'Fiat', 'model': 'Panda', 'registration_number': f'BS{i:05d}',
+                                          'owner_id': 1} for i in range(VEHICLES)])
+    db.session.execute(insert(RepairOrder), [{'description': 'x', 'status': 'Gotowe', 'vehicle_id': i % VEHICLES + 1}
+                                             for i in range(ORDERS)])
+    # Części z ruchem w księdze - start nie ma czego uzupełniać, ale i tak to sprawdza
+    db.session.add_all([Part(name=f'Część {i}', price=10.0, stock_quantity=5) for i in range(PARTS)])
+    db.session.commit()
+
+
+def build_databases(tmp):
+    branches = {f'o{i}': f"sqlite:///{Path(tmp) / f'o{i}.db'}" for i in range(BRANCHES)}
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(tmp) / 'start.db'}", 'WORKSHOP_BRANCHES': branches}
+    app = create_app(config)
+    with app.app_context():
+        seed()
+        for code in branches:
+            with use_branch(code):
+                seed()
+        db.engine.dispose()
+    return app, config
+
+
+def measure(config):
+    samples = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, '-c', MEASURE.format(config=config)],
+                                capture_output=True, text=True, check=True).stdout
+        samples.append([float(value) for value in output.split()])
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def schema_check_ms(app):
+    """Sam krok, który FAST_START pomija - przy każdym starcie pełnym, dla wszystkich baz."""
+    samples = []
+    with app.app_context():
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            create_schema()
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        app, config = build_databases(tmp)
+        print(f"Baza główna + {BRANCHES} oddziały, w każdej {ORDERS} zleceń i {PARTS} części")
+        print(f"  sprawdzenie schematu (create_all + kolumny, indeksy, bilans otwarcia): "
+              f"{schema_check_ms(app):6.1f} ms na start")
+        for label, overrides in [
+            ('pełny start', {}),
+            ('FAST_START', {'FAST_START': True}),
+            ('FAST_START, tylko mechanik', {'FAST_START': True, 'PANELS': ['mechanic']}),
+        ]:
+            imports, create, first_request = measure({**config, **overrides})
+            print(f"{label:28s} import: {imports * 1000:6.1f} ms  create_app: {create * 1000:6.1f} ms  "
+                  f"pierwsze żądanie: {first_request * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    run_benchmark()
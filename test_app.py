@@ -1,18 +1,43 @@
+import asyncio
+import gzip
+import socketserver
+import threading
 import pytest
+import numpy as np
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from app import create_app, db
-from app.models import User, Vehicle, Part, Service
+from app.models import User, Vehicle, Part, Service, RepairOrder, Notification, StockMovement, StockSnapshot, ServiceDue
 from app.routes import validate_nip
+from app.branches import use_branch
+from app.forecast import consumption_matrix, reorder_points, refresh_forecast
+from app.notifications import EmailAdapter, drain_outbox
+from app.panels.mechanic import finished_tasks, task_queue
+from app.panels.owner import active_count
+from app.parallel import run_query
+from sqlalchemy import event, update
+from app.routing import RoutingSession
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import joinedload
+from app.loading import load_profile
+from app.stock import stock_levels, take_snapshots
+from app.reminders import queue_due_reminders, rebuild_service_due
+from app.analytics import build_snapshot, combine, refresh_snapshot, summarize
+from app.backup import BackupError, backup_database, list_backups, prune_backups, restore_database
 from werkzeug.security import generate_password_hash, check_password_hash
 
+PASSWORD = generate_password_hash("haslo")
+CLIENT_EMAIL = "klient@warsztat.pl"
+
 
 #KONFIGURACJA
 @pytest.fixture
 def app():
-    app = create_app()
-    app.config.update({
+    app = create_app({
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
-        "WTF_CSRF_ENABLED": False
+        "WTF_CSRF_ENABLED": False,
+        "FAST_START": True,
     })
 
     with app.app_context():
@@ -22,6 +47,67 @@ def app():
         db.drop_all()
 
 
+@pytest.fixture
+def make_user(app):
+    """Konto z hasłem "haslo" - gotowe do logowania przez fixture login."""
+    def create(email, role="client", first_name="Jan", last_name="Test"):
+        user = User(first_name=first_name, last_name=last_name, email=email, role=role, password=PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return create
+
+
+@pytest.fixture
+def make_order(make_user):
+    """Zlecenie na nowy pojazd klienta testowego (CLIENT_EMAIL), z usługami i częściami po jednej sztuce.
+
+    Pozycje są dodawane przed wpięciem do sesji - relacje zapisanego zlecenia nie ładują się same.
+    Commit zostaje po stronie testu.
+    """
+    def create(registration, make="Fiat", model="Panda", services=(), parts=(), **fields):
+        owner = User.query.filter_by(email=CLIENT_EMAIL).first() or make_user(CLIENT_EMAIL)
+        order = RepairOrder(vehicle=Vehicle(make=make, model=model, registration_number=registration,
+                                            owner_id=owner.id), **{"description": "Zlecenie", **fields})
+        for service in services:
+            order.add_service(service)
+        for part in parts:
+            order.add_part(part, 1)
+        db.session.add(order)
+        return order
+    return create
+
+
+@pytest.fixture
+def login(app):
+    """Klient HTTP zalogowany na podane konto."""
+    def client_for(email, password="haslo"):
+        client = app.test_client()
+        client.post('/login', data={"email": email, "password": password})
+        return client
+    return client_for
+
+
+@pytest.fixture
+def count_queries(app):
+    """Lista zapytań SQL wysłanych do bazy wewnątrz bloku with."""
+    @contextmanager
+    def counting():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+    return counting
+
+
+def for_edit(order):
+    """Zlecenie z pozycjami załadowanymi do zmiany (relacje domyślnie nie ładują się same)."""
+    return db.session.get(RepairOrder, order.id, options=load_profile('edit'), populate_existing=True)
+
+
 #KLASY TESTOWE
 class TestUserModel:
     def test_password_hashing_security(self, app):
@@ -102,6 +188,919 @@ class TestServiceModel:
         assert service.base_price == 120.50
         assert isinstance(service.base_price, float), "Cena powinna być typu float"
 
+class TestRepairCosts:
+    def test_totals_maintained_on_write(self, app, make_order):
+        order = make_order("DW COST1", make="Opel", model="Astra", description="Test")
+        service = Service(name="Przegląd", base_price=150.0)
+        part = Part(name="Filtr", price=45.0, stock_quantity=10)
+        db.session.add_all([service, part])
+        db.session.commit()
+
+        order = for_edit(order)
+        order.add_service(service)
+        order.add_part(part, 2)
+        db.session.commit()
+
+        assert order.services_total == 150.0
+        assert order.parts_total == 90.0
+        assert order.grand_total == 240.0
+
+    def test_price_change_does_not_rewrite_history(self, app, make_order):
+        order = make_order("DW COST1", make="Opel", model="Astra", description="Test")
+        service = Service(name="Przegląd", base_price=150.0)
+        part = Part(name="Filtr", price=45.0, stock_quantity=10)
+        db.session.add_all([service, part])
+        db.session.commit()
+        order = for_edit(order)
+        order.add_service(service)
+        order.add_part(part, 1)
+        db.session.commit()
+
+        service.base_price = 999.0
+        part.price = 999.0
+        db.session.commit()
+
+        fetched = for_edit(order)
+        assert fetched.grand_total == 195.0, "Suma zlecenia nie może zależeć od bieżącego cennika"
+        assert fetched.service_links[0].price == 150.0
+        assert fetched.used_parts[0].unit_price == 45.0
+
+    def test_replace_service_updates_totals(self, app, make_order):
+        order = make_order("DW COST1", make="Opel", model="Astra", description="Test")
+        cheap = Service(name="Diagnostyka", base_price=50.0)
+        expensive = Service(name="Hamulce", base_price=400.0)
+        db.session.add_all([cheap, expensive])
+        db.session.commit()
+        order = for_edit(order)
+        order.add_service(cheap)
+        db.session.commit()
+
+        order = for_edit(order)
+        order.replace_service(expensive)
+        db.session.commit()
+
+        assert [link.service_id for link in order.service_links] == [expensive.id]
+        assert order.grand_total == 400.0
+
+class TestPartsForecast:
+    def test_reorder_point_vectorized(self):
+        daily = consumption_matrix(np.array([0, 0, 1]), np.array([0, 1, 1]), np.array([2.0, 2.0, 5.0]), 2, 2)
+        assert daily.tolist() == [[2.0, 2.0], [0.0, 5.0]]
+
+        rate, reorder_point, suggested = reorder_points(daily, np.array([3.0, 3.0]), np.array([100.0, 0.0]),
+                                                        np.zeros(2), z=0)
+        assert rate.tolist() == [2.0, 2.5]
+        assert reorder_point.tolist() == [6.0, 7.5]
+        assert suggested.tolist() == [0, 25], "Zamawiamy tylko część poniżej punktu zamówienia"
+
+    def test_refresh_forecast_includes_open_orders(self, app):
+        now = datetime(2026, 6, 1)
+        owner = User(first_name="A", last_name="B", email="prognoza@b.pl", role="client", password="x")
+        service = Service(name="Wymiana oleju", base_price=250.0)
+        part = Part(name="Filtr", price=45.0, stock_quantity=1, lead_time_days=2)
+        db.session.add_all([owner, service, part])
+        db.session.commit()
+        car = Vehicle(make="Opel", model="Astra", registration_number="DW PROG1", owner_id=owner.id)
+        db.session.add(car)
+        db.session.commit()
+
+        done = RepairOrder(description="Olej", vehicle_id=car.id, status='Gotowe', start_date=now - timedelta(days=5))
+        done.add_service(service)
+        done.add_part(part, 2)
+        booked = RepairOrder(description="Olej", vehicle_id=car.id, start_date=now + timedelta(days=1))
+        booked.add_service(service)
+        db.session.add_all([done, booked])
+        db.session.commit()
+
+        forecast = refresh_forecast(now)[0]
+        assert forecast['part_id'] == part.id
+        assert forecast['reorder_point'] > 2, "Otwarte zlecenie na wymianę oleju powinno podnieść zapotrzebowanie"
+        assert forecast['suggested_quantity'] > 0
+
+        booked.status = 'Anulowane'
+        db.session.commit()
+        cancelled = refresh_forecast(now)[0]
+        assert cancelled['reorder_point'] == pytest.approx(forecast['reorder_point'] - 2), \
+            "Anulowane zlecenie nie jest zapotrzebowaniem"
+
+class TestBranches:
+    def test_owner_panel_aggregates_all_branches(self, tmp_path):
+        app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "WORKSHOP_BRANCHES": {
+                "krk": f"sqlite:///{tmp_path / 'krk.db'}",
+                "waw": f"sqlite:///{tmp_path / 'waw.db'}",
+            },
+        })
+        with app.app_context():
+            for code, income in [("krk", 100.0), ("waw", 250.0)]:
+                with use_branch(code):
+                    owner = User(first_name="W", last_name=code, email="owner@w.pl", role="owner",
+                                 password=generate_password_hash("haslo"))
+                    client = User(first_name="K", last_name=code, email="klient@w.pl", role="client", password="x")
+                    db.session.add_all([owner, client])
+                    db.session.commit()
+                    car = Vehicle(make="Fiat", model="Panda", registration_number="KR1", owner_id=client.id)
+                    db.session.add(car)
+                    db.session.commit()
+                    db.session.add(RepairOrder(description="x", vehicle_id=car.id, status='Gotowe', grand_total=income))
+                    db.session.add(RepairOrder(description="y", vehicle_id=car.id))
+                    db.session.commit()
+
+        client = app.test_client()
+        response = client.post('/login', data={"email": "owner@w.pl", "password": "haslo", "branch": "waw"})
+        assert response.status_code == 302
+
+        page = client.get('/panel/owner').get_data(as_text=True)
+        assert "350.00 PLN" in page, "Przychód powinien obejmować wszystkie oddziały"
+
+        with app.app_context(), use_branch("krk"):
+            assert RepairOrder.query.count() == 2, "Każdy oddział ma własną bazę"
+
+    def test_login_attempt_in_other_branch_keeps_identity(self, tmp_path):
+        app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "WORKSHOP_BRANCHES": {"a": f"sqlite:///{tmp_path / 'a.db'}", "b": f"sqlite:///{tmp_path / 'b.db'}"},
+        })
+        with app.app_context():
+            for code, role in [("a", "client"), ("b", "owner")]:
+                with use_branch(code):
+                    db.session.add(User(first_name="U", last_name=code, email=f"{code}@w.pl", role=role,
+                                        password=generate_password_hash("haslo")))
+                    db.session.commit()
+
+        client = app.test_client()
+        client.post('/login', data={"email": "a@w.pl", "password": "haslo", "branch": "a"})
+        client.post('/login', data={"email": "b@w.pl", "password": "zle", "branch": "b"})
+        client.post('/register', data={"email": "nowy@w.pl", "password": "haslo", "first_name": "N",
+                                       "last_name": "K", "role": "client", "branch": "b"})
+        assert client.get('/panel/owner').status_code == 302
+        assert client.get('/owner/report_pdf').status_code == 403
+        assert client.get('/panel/client').status_code == 200
+
+        with client.session_transaction() as http_session:
+            assert http_session["branch"] == "a"
+            http_session["branch"] = "b"
+        assert client.get('/panel/owner').status_code == 302, "Sesja oddziału a nie loguje do oddziału b"
+
+class TestReadRouting:
+    def test_reads_go_to_replica_until_write(self, tmp_path):
+        app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "SQLITE_WAL_READS": True,
+        })
+        replica = app.extensions['read_replicas'][None]
+        query = db.select(User)
+
+        with app.test_request_context('/panel/reception'):
+            assert db.session.get_bind(clause=query) is replica
+        with app.test_request_context('/panel/reception', method='POST'):
+            assert db.session.get_bind(clause=query) is db.engine
+
+        client = app.test_client()
+        client.post('/login', data={"email": "nikt@w.pl", "password": "x"})
+        with client.session_transaction() as flask_session:
+            assert flask_session['_read_primary_until'] > 0, "Po zapisie odczyty idą do bazy głównej"
+
+class TestAsyncPanels:
+    def test_reception_panel_lists_orders(self, app, make_user, make_order, login):
+        make_order("KR ASYNC", make="Skoda", model="Fabia", description="Hałas")
+        db.session.commit()
+
+        make_user("reception@panel.pl", "reception")
+        client = login("reception@panel.pl")
+        for url in ['/panel/reception', '/reception/create_order']:
+            response = client.get(url)
+            assert response.status_code == 200
+            assert "KR ASYNC" in response.get_data(as_text=True)
+
+    def test_edit_form_loaded_on_demand(self, app, make_user, make_order, login):
+        mechanic = make_user("marek@panel.pl", "mechanic", "Marek", "Klucz")
+        order = make_order("KR MODAL", make="Skoda", model="Fabia", description="Hałas", mechanic_id=mechanic.id)
+        db.session.commit()
+
+        make_user("reception@panel.pl", "reception")
+        client = login("reception@panel.pl")
+        panel = client.get('/panel/reception').get_data(as_text=True)
+        assert "Klucz" in panel
+        assert 'name="description"' not in panel, "Lista nie powinna zawierać formularzy edycji"
+
+        form = client.get(f'/reception/repair/{order.id}/edit_form').get_data(as_text=True)
+        assert f'value="{mechanic.id}" selected' in form
+        assert client.get('/reception/repair/999/edit_form').status_code == 404
+
+    def test_owner_panel_renders(self, app, make_user, login):
+        make_user("owner@panel.pl", "owner")
+        client = login("owner@panel.pl")
+        response = client.get('/panel/owner')
+        assert response.status_code == 200
+        assert "owner@panel.pl" not in response.get_data(as_text=True), "Lista pracowników bez właściciela"
+
+    def test_active_count_skips_cancelled_orders(self, app, make_order):
+        for i, status in enumerate(['Zgłoszone', 'W trakcie naprawy', 'Gotowe', 'Anulowane']):
+            make_order(f"KR ACT{i}", status=status)
+        db.session.commit()
+
+        assert active_count(db.session.connection()) == 2
+
+    def test_query_sessions_return_connections_to_pool(self, tmp_path):
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'pula.db'}"})
+        with app.app_context():
+            owner = User(first_name="A", last_name="B", email="klient@pula.pl", role="client", password=PASSWORD)
+            reception = User(first_name="R", last_name="P", email="rec@pula.pl", role="reception", password=PASSWORD)
+            db.session.add_all([owner, reception,
+                                Vehicle(make="Fiat", model="Panda", registration_number="KR POOL", owner=owner)])
+            db.session.commit()
+            db.session.remove()
+
+            vehicles = asyncio.run(run_query(lambda s: s.query(Vehicle).options(joinedload(Vehicle.owner)).all()))
+            assert db.engine.pool.checkedout() == 0, "Sesja zapytania oddaje połączenie zaraz po wykonaniu"
+            assert vehicles[0].owner.email == "klient@pula.pl"
+
+        # 8 klientów naraz na widoku z czterema równoległymi zapytaniami mieści się w puli (5 + 10 połączeń)
+        statuses = []
+
+        def reception_session():
+            client = app.test_client()
+            client.post('/login', data={"email": "rec@pula.pl", "password": "haslo"})
+            statuses.extend(client.get('/reception/create_order').status_code for _ in range(5))
+
+        threads = [threading.Thread(target=reception_session) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert statuses == [200] * 40
+        with app.app_context():
+            assert db.engine.pool.checkedout() == 0
+
+class TestFastStart:
+    def test_only_selected_panels_are_loaded(self):
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                          "FAST_START": True, "PANELS": ["mechanic"]})
+        assert "mechanic" in app.blueprints
+        assert "owner" not in app.blueprints
+        assert app.test_client().get('/panel/owner').status_code == 404
+
+    def test_fast_start_skips_schema_until_init_db(self):
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "FAST_START": True})
+        with app.app_context():
+            assert not db.inspect(db.engine).has_table("repair_order")
+
+        result = app.test_cli_runner().invoke(args=["init-db"])
+        assert result.exit_code == 0
+        with app.app_context():
+            assert db.inspect(db.engine).has_table("repair_order")
+
+class TestBatchOperations:
+    @pytest.fixture
+    def batch(self, make_user, make_order, login):
+        mechanic = make_user("mech@b.pl", "mechanic")
+        make_user("rec@b.pl", "reception")
+        part = Part(name="Filtr", price=45.0, stock_quantity=10)
+        db.session.add(part)
+        orders = [make_order(f"KR B{i}", description=f"Zlecenie {i}", parts=[part] if i == 2 else ())
+                  for i in range(3)]
+        db.session.commit()
+        return login("rec@b.pl"), mechanic, [order.id for order in orders]
+
+    def test_batch_assign_reports_per_item(self, app, batch):
+        client, mechanic, ids = batch
+        response = client.post('/reception/batch/assign',
+                               data={"mechanic_id": mechanic.id, "repair_ids": [ids[0], ids[1], 999]})
+
+        report = response.get_json()
+        assert report["updated"] == 2
+        assert report["results"][-1] == {"id": 999, "result": "not_found"}
+        assert {o.mechanic_id for o in RepairOrder.query.filter(RepairOrder.id.in_(ids[:2]))} == {mechanic.id}
+
+    def test_batch_assign_keeps_finished_and_started_orders(self, app, batch):
+        client, mechanic, ids = batch
+        for repair_id, status in zip(ids, ["Zgłoszone", "W trakcie naprawy", "Gotowe"]):
+            db.session.get(RepairOrder, repair_id).status = status
+        db.session.commit()
+
+        report = client.post('/reception/batch/assign', data={"mechanic_id": mechanic.id, "repair_ids": ids}).get_json()
+        assert [item["result"] for item in report["results"]] == ["ok", "ok", "finished"]
+        orders = [db.session.get(RepairOrder, repair_id) for repair_id in ids]
+        assert [order.status for order in orders] == ["Przyjęte do realizacji", "W trakcie naprawy", "Gotowe"]
+        assert [order.mechanic_id for order in orders] == [mechanic.id, mechanic.id, None]
+
+    def test_batch_reschedule_keeps_finished_orders(self, app, batch):
+        client, _, ids = batch
+        for repair_id, status in zip(ids[1:], ["Gotowe", "Anulowane"]):
+            db.session.get(RepairOrder, repair_id).status = status
+        db.session.commit()
+        before = {repair_id: db.session.get(RepairOrder, repair_id).start_date for repair_id in ids}
+
+        report = client.post('/reception/batch/reschedule',
+                             data={"date": "2026-11-02", "time": "09:30", "repair_ids": ids + [999]}).get_json()
+        assert report["updated"] == 1
+        assert [item["result"] for item in report["results"]] == ["ok", "finished", "finished", "not_found"]
+        orders = [db.session.get(RepairOrder, repair_id, populate_existing=True) for repair_id in ids]
+        assert orders[0].start_date == datetime(2026, 11, 2, 9, 30)
+        assert [order.start_date for order in orders[1:]] == [before[ids[1]], before[ids[2]]]
+
+    def test_batch_delete_skips_orders_with_parts(self, app, batch):
+        client, _, ids = batch
+        report = client.post('/reception/batch/delete', data={"repair_ids": ids}).get_json()
+
+        assert [item["result"] for item in report["results"]] == ["ok", "ok", "has_parts"]
+        assert [o.id for o in RepairOrder.query.all()] == [ids[2]]
+
+    def test_batch_status_rejects_unknown_status(self, app, batch):
+        client, _, ids = batch
+        assert client.post('/reception/batch/status', data={"status": "Zepsute", "repair_ids": ids}).status_code == 400
+
+        client.post('/reception/batch/status', data={"status": "Gotowe", "repair_ids": ids[:1]})
+        assert db.session.get(RepairOrder, ids[0]).end_date is not None
+
+@pytest.fixture
+def versioned_order(make_user, make_order):
+    """Zlecenie z przypisanym mechanikiem i część na stanie; zwraca (id zlecenia, id części)."""
+    mechanic = make_user("mech@wersja.pl", "mechanic")
+    make_user("rec@wersja.pl", "reception")
+    part = Part(name="Filtr", price=45.0, stock_quantity=1000)
+    order = make_order("KR VER1", description="Stuki", mechanic_id=mechanic.id)
+    db.session.add(part)
+    db.session.commit()
+    return order.id, part.id
+
+
+class TestOptimisticLocking:
+    def test_stale_form_gets_conflict_with_current_state(self, app, versioned_order, login):
+        order_id, _ = versioned_order
+        client = login("rec@wersja.pl")
+        client.post(f'/repair/edit/{order_id}', data={"description": "Pierwsza zmiana", "version": 1})
+
+        response = client.post(f'/repair/edit/{order_id}', data={"description": "Druga zmiana", "version": 1},
+                               headers={"Accept": "application/json"})
+        assert response.status_code == 409
+        conflict = response.get_json()
+        assert conflict["current"]["description"] == "Pierwsza zmiana"
+        assert conflict["current"]["version"] == 2
+        assert conflict["submitted"]["description"] == "Druga zmiana"
+
+    @pytest.mark.parametrize("url", ["/assign_mechanic/{}", "/appointment/delete/{}"])
+    def test_write_racing_another_change_gets_conflict(self, app, versioned_order, make_user, login, url):
+        order_id, _ = versioned_order
+        mechanic_id = db.session.get(RepairOrder, order_id).mechanic_id
+        other = make_user("inny@wersja.pl", "mechanic")
+        client = login("rec@wersja.pl")
+        table = RepairOrder.__table__
+
+        edits = []
+
+        def concurrent_edit(session, flush_context, instances):
+            if not edits:
+                edits.append(session.connection().execute(
+                    update(table).values(version=table.c.version + 1, description="Cudza")))
+
+        event.listen(RoutingSession, "before_flush", concurrent_edit)
+        try:
+            response = client.post(url.format(order_id), data={"mechanic_id": other.id},
+                                   headers={"Accept": "application/json"})
+        finally:
+            event.remove(RoutingSession, "before_flush", concurrent_edit)
+        assert response.status_code == 409
+        assert edits, "Zmiana konkurencyjna powinna trafić przed zapis"
+        assert db.session.get(RepairOrder, order_id).mechanic_id == mechanic_id
+
+
+class TestConcurrentWrites:
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Baza w pliku - wątki mechaników piszą przez osobne połączenia."""
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'stress.db'}"})
+        with app.app_context():
+            yield app
+            db.session.remove()
+
+    def test_concurrent_note_appends_are_not_lost(self, app, versioned_order, login):
+        order_id, part_id = versioned_order
+        # Odczyt po commicie trzyma transakcję; sesja testu nie może blokować zapisów wątków
+        db.session.remove()
+
+        workers, reports_each = 4, 10
+        accepted = {"notes": 0, "parts": 0}
+        unexpected = []
+        json_only = {"Accept": "application/json"}
+
+        def mechanic_session():
+            client = login("mech@wersja.pl")
+            for _ in range(reports_each):
+                for kind, url, data in [("notes", f'/report_missing_part/{order_id}', {"part_id": part_id}),
+                                        ("parts", f'/add_part/{order_id}', {"part_id": part_id, "quantity": 1})]:
+                    status = client.post(url, data=data, headers=json_only).status_code
+                    if status == 302:
+                        accepted[kind] += 1
+                    elif status != 409:
+                        unexpected.append(status)
+
+        threads = [threading.Thread(target=mechanic_session) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        order = db.session.get(RepairOrder, order_id, options=load_profile('edit'))
+        assert unexpected == []
+        assert accepted["notes"] > 0 and accepted["parts"] > 0
+        # Każdy zapis potwierdzony klientowi musi być w bazie - konflikt jest zgłaszany, a nie gubiony
+        assert len(order.mechanic_notes.splitlines()) == accepted["notes"]
+        assert sum(item.quantity for item in order.used_parts) == accepted["parts"]
+        assert db.session.get(Part, part_id).stock_quantity == 1000 - accepted["parts"]
+        assert order.parts_total == 45.0 * accepted["parts"]
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Minimalny serwer SMTP do testów - zapamiętuje treść każdej przyjętej wiadomości."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.messages = []
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 test\r\n")
+        for line in self.rfile:
+            command = line.strip().upper()
+            if command == b"DATA":
+                self.wfile.write(b"354 dalej\r\n")
+                self.server.messages.append(b"".join(iter(self.rfile.readline, b".\r\n")).decode())
+            elif command == b"QUIT":
+                self.wfile.write(b"221 koniec\r\n")
+                return
+            self.wfile.write(b"250 ok\r\n")
+
+
+class TestNotificationOutbox:
+    @pytest.fixture
+    def outbox(self, make_user, make_order, login):
+        mechanic = make_user("mech@outbox.pl", "mechanic")
+        order = make_order("KR OUT1", description="Stuki", mechanic_id=mechanic.id)
+        db.session.commit()
+        return login("mech@outbox.pl"), order.id
+
+    def test_status_change_writes_outbox_and_worker_sends_it(self, app, outbox):
+        client, order_id = outbox
+        client.post(f'/mechanic/update_order/{order_id}', data={"mechanic_notes": "Bez zmiany statusu"})
+        assert Notification.query.count() == 0
+
+        client.post(f'/complete_repair/{order_id}')
+        notification = Notification.query.one()
+        assert (notification.status, notification.recipient) == ("pending", CLIENT_EMAIL)
+
+        server = SmtpStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            adapters = {"email": EmailAdapter(*server.server_address, "warsztat@test.pl")}
+            assert drain_outbox(adapters) == (1, 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert db.session.get(Notification, notification.id).status == "sent"
+        assert "KR OUT1" in server.messages[0]
+
+    def test_failed_delivery_is_retried_with_backoff(self, app, outbox):
+        client, order_id = outbox
+        client.post(f'/complete_repair/{order_id}')
+
+        class Broken:
+            def send(self, notification):
+                raise ConnectionRefusedError("smtp nie odpowiada")
+
+        now = datetime.now() + timedelta(minutes=1)
+        assert drain_outbox({"email": Broken()}, now=now) == (0, 1)
+        assert drain_outbox({"email": Broken()}, now=now) == (0, 0)
+        notification = Notification.query.one()
+        assert notification.attempts == 1
+        assert notification.next_attempt_at == now + timedelta(seconds=30)
+
+        for attempt in range(4):
+            drain_outbox({"email": Broken()}, now=now + timedelta(days=1 + attempt))
+        assert (notification.status, notification.attempts) == ("failed", 5)
+
+class TestResponseLayer:
+    @pytest.fixture
+    def reception(self, make_user, make_order, login):
+        make_user("rec@cache.pl", "reception")
+        order = make_order("KR GZ1", description="Stuki", status="Gotowe")
+        db.session.commit()
+        return login("rec@cache.pl"), order.id
+
+    def test_panel_is_compressed_and_private(self, app, reception):
+        client, _ = reception
+        plain = client.get('/panel/reception')
+        packed = client.get('/panel/reception', headers={"Accept-Encoding": "gzip"})
+
+        assert packed.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(packed.data) == plain.data
+        assert len(packed.data) < len(plain.data) / 3
+        assert packed.headers["Cache-Control"] == "private, no-cache"
+        assert "Accept-Encoding" in packed.headers["Vary"]
+
+    def test_invoice_revalidates_with_etag(self, app, reception):
+        client, order_id = reception
+        first = client.get(f'/history/{order_id}/invoice')
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        etag = first.headers["ETag"]
+
+        again = client.get(f'/history/{order_id}/invoice', headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.data == b""
+
+        client.post(f'/repair/edit/{order_id}', data={"description": "Zmiana opisu"})
+        changed = client.get(f'/history/{order_id}/invoice', headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+    def test_static_files_are_long_lived_and_revalidate(self, app, tmp_path):
+        (tmp_path / "panel.css").write_text(".karta { margin: 0; }\n" * 200)
+        app.static_folder = str(tmp_path)
+        client = app.test_client()
+
+        response = client.get('/static/panel.css', headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.cache_control.public and response.cache_control.max_age == app.config["STATIC_MAX_AGE"]
+        assert not response.cache_control.no_cache
+        assert gzip.decompress(response.data) == (tmp_path / "panel.css").read_bytes()
+        etag, weak = response.get_etag()
+        assert etag and weak
+
+        again = client.get('/static/panel.css', headers={"Accept-Encoding": "gzip", "If-None-Match": f'W/"{etag}"'})
+        assert again.status_code == 304
+
+class TestMechanicQueue:
+    def _setup(self, make_user, make_order, active):
+        mechanic = make_user("mech@kolejka.pl", "mechanic")
+        part = Part(name="Filtr", price=45.0, stock_quantity=10)
+        db.session.add(part)
+        for i, status in enumerate(active + ["Gotowe"] * 12):
+            make_order(f"KR Q{i}", description=f"Zlecenie {i}", status=status, mechanic_id=mechanic.id,
+                       start_date=datetime(2026, 1, 1) + timedelta(days=i % 5),
+                       end_date=datetime(2026, 2, 1) + timedelta(days=i) if status == "Gotowe" else None,
+                       parts=[part])
+        db.session.commit()
+        return mechanic
+
+    def test_queue_holds_only_active_orders_by_priority(self, app, make_user, make_order):
+        mechanic = self._setup(make_user, make_order, ["Czeka na części", "Zgłoszone", "W trakcie naprawy",
+                                                       "Anulowane", "Przyjęte do realizacji"])
+        tasks = task_queue(mechanic.id)
+        assert [task.status for task in tasks] == ["W trakcie naprawy", "Przyjęte do realizacji", "Zgłoszone",
+                                                   "Czeka na części"]
+
+        done = finished_tasks(mechanic.id, page=2)
+        assert (done.total, done.pages, len(done.items)) == (13, 2, 3)
+        assert all(task.status in ("Gotowe", "Anulowane") for task in done.items)
+
+    def test_panel_query_count_does_not_grow_with_tasks(self, app, make_user, make_order, login, count_queries):
+        counts = []
+        for active in (["W trakcie naprawy"] * 2, ["W trakcie naprawy"] * 8):
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            self._setup(make_user, make_order, active)
+            client = login("mech@kolejka.pl")
+            with count_queries() as statements:
+                assert client.get('/panel/mechanic').status_code == 200
+            counts.append(len(statements))
+        assert counts[0] == counts[1]
+
+class TestLoadingProfiles:
+    def _setup(self, make_user, make_order, orders):
+        make_user("rec@profil.pl", "reception")
+        service = Service(name="Przeglad", base_price=100.0)
+        part = Part(name="Filtr", price=10.0, stock_quantity=100)
+        db.session.add_all([service, part])
+        db.session.commit()
+        for i in range(orders):
+            make_order(f"KR P{i}", description="Stuki", status="Gotowe", end_date=datetime(2026, 1, 2),
+                       services=[service], parts=[part])
+        db.session.commit()
+
+    def test_relation_outside_profile_raises(self, app, make_user, make_order):
+        self._setup(make_user, make_order, 1)
+        db.session.expunge_all()
+        repair = RepairOrder.query.options(*load_profile('list')).one()
+        assert repair.vehicle.owner.email == CLIENT_EMAIL
+        with pytest.raises(InvalidRequestError):
+            repair.used_parts
+
+    @pytest.mark.parametrize("email, url", [("rec@profil.pl", "/panel/reception"),
+                                            (CLIENT_EMAIL, "/history"),
+                                            ("rec@profil.pl", "/history/1/invoice")])
+    def test_query_count_is_fixed_per_route(self, app, make_user, make_order, login, count_queries, email, url):
+        counts = []
+        for orders in (2, 12):
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            self._setup(make_user, make_order, orders)
+            client = login(email)
+            with count_queries() as statements:
+                assert client.get(url).status_code == 200
+            counts.append(len(statements))
+        assert counts[0] == counts[1] <= 4
+
+class TestStockLedger:
+    @pytest.fixture
+    def stock(self):
+        return 0
+
+    @pytest.fixture
+    def warehouse(self, make_user, make_order, stock):
+        mechanic = make_user("mech@magazyn.pl", "mechanic")
+        make_user("rec@magazyn.pl", "reception")
+        make_user("szef@magazyn.pl", "owner")
+        part = Part(name="Klocki", price=180.0, stock_quantity=stock)
+        db.session.add(part)
+        orders = [make_order(f"KR M{i}", description=f"Hamulce {i}", mechanic_id=mechanic.id) for i in range(2)]
+        db.session.commit()
+        return part.id, [order.id for order in orders]
+
+    @pytest.mark.parametrize("stock", [10])
+    def test_levels_from_snapshot_match_full_ledger(self, app, warehouse, login):
+        part_id, (order_id, _) = warehouse
+        login("mech@magazyn.pl").post(f'/add_part/{order_id}', data={"part_id": part_id, "quantity": 3})
+        take_snapshots()
+        login("szef@magazyn.pl").post('/owner/stock/receive', data={"part_id": part_id, "quantity": 5})
+        login("mech@magazyn.pl").post(f'/add_part/{order_id}', data={"part_id": part_id, "quantity": 1})
+
+        snapshot = db.session.get(StockSnapshot, part_id)
+        assert snapshot.on_hand == 7
+        assert StockMovement.query.filter(StockMovement.id > snapshot.last_movement_id).count() == 2
+        full = sum(m.on_hand_delta for m in StockMovement.query.filter_by(part_id=part_id))
+        assert stock_levels()[part_id].on_hand == full == db.session.get(Part, part_id).stock_quantity == 11
+        assert take_snapshots() == {}
+
+    def test_reservation_blocks_other_orders_until_released(self, app, warehouse, login):
+        part_id, (waiting_id, other_id) = warehouse
+        login("mech@magazyn.pl").post(f'/report_missing_part/{waiting_id}', data={"part_id": part_id, "quantity": 2})
+        assert stock_levels()[part_id] == (0, 2, -2)
+
+        login("szef@magazyn.pl").post('/owner/stock/receive', data={"part_id": part_id, "quantity": 2})
+        mechanic = login("mech@magazyn.pl")
+        mechanic.post(f'/add_part/{other_id}', data={"part_id": part_id, "quantity": 1})
+        assert stock_levels()[part_id] == (2, 2, 0)
+
+        mechanic.post(f'/add_part/{waiting_id}', data={"part_id": part_id, "quantity": 1})
+        assert stock_levels()[part_id] == (1, 1, 0)
+        mechanic.post(f'/complete_repair/{waiting_id}')
+        assert stock_levels()[part_id] == (1, 0, 1)
+
+    def test_panel_offers_parts_reserved_for_the_order(self, app, warehouse, login):
+        part_id, (waiting_id, other_id) = warehouse
+        mechanic = login("mech@magazyn.pl")
+        mechanic.post(f'/report_missing_part/{waiting_id}', data={"part_id": part_id, "quantity": 2})
+        login("szef@magazyn.pl").post('/owner/stock/receive', data={"part_id": part_id, "quantity": 2})
+        assert stock_levels()[part_id] == (2, 2, 0)
+
+        mechanic = login("mech@magazyn.pl")
+        page = mechanic.get('/panel/mechanic').get_data(as_text=True)
+        assert f'/add_part/{waiting_id}' in page
+        assert f'/add_part/{other_id}' not in page
+
+        mechanic.post(f'/add_part/{waiting_id}', data={"part_id": part_id, "quantity": 2})
+        assert stock_levels()[part_id] == (0, 0, 0)
+        assert db.session.get(RepairOrder, waiting_id).parts_total == 360
+
+    def test_cancelled_orders_release_reservations(self, app, warehouse, login):
+        part_id, order_ids = warehouse
+        mechanic = login("mech@magazyn.pl")
+        for order_id in order_ids:
+            mechanic.post(f'/report_missing_part/{order_id}', data={"part_id": part_id})
+        assert stock_levels()[part_id].reserved == 2
+
+        reception = login("rec@magazyn.pl")
+        reception.post(f'/repair/edit/{order_ids[0]}', data={"status": "Anulowane"})
+        assert stock_levels()[part_id].reserved == 1
+        reception.post('/reception/batch/status', data={"status": "Anulowane", "repair_ids": order_ids[1:]})
+        assert stock_levels()[part_id].reserved == 0
+
+class TestServiceReminders:
+    @pytest.fixture
+    def inspections(self, make_user, make_order):
+        mechanic = make_user("mech@terminy.pl", "mechanic")
+        make_user("rec@terminy.pl", "reception")
+        make_user("szef@terminy.pl", "owner")
+        inspection = Service(name="Przegląd okresowy", base_price=150.0, reminder_days=365)
+        tyres = Service(name="Wymiana opon", base_price=100.0)
+        db.session.add_all([inspection, tyres])
+        db.session.commit()
+        orders = [make_order(f"KR T{i}", make="Skoda", model="Fabia", description=f"Przegląd {i}",
+                             mechanic_id=mechanic.id, services=[inspection, tyres]) for i in range(2)]
+        db.session.commit()
+        return inspection.id, [order.id for order in orders]
+
+    def test_completion_schedules_single_reminder_with_booking_link(self, app, inspections, login):
+        service_id, (order_id, _) = inspections
+        login("mech@terminy.pl").post(f'/complete_repair/{order_id}')
+        Notification.query.delete()
+
+        due = ServiceDue.query.one()
+        order = db.session.get(RepairOrder, order_id)
+        assert (due.service_id, due.last_repair_id) == (service_id, order_id)
+        assert due.next_due == order.end_date + timedelta(days=365)
+        assert due.remind_at == due.next_due - timedelta(days=14)
+
+        assert queue_due_reminders(now=due.remind_at - timedelta(days=1)) == 0
+        assert queue_due_reminders(now=due.remind_at) == 1
+        assert queue_due_reminders(now=due.remind_at) == 0
+        notification = Notification.query.one()
+        assert notification.recipient == CLIENT_EMAIL
+        assert f"/book_appointment?vehicle_id={due.vehicle_id}&service_id={service_id}" in notification.body
+
+        booking = login(CLIENT_EMAIL).get(f'/book_appointment?vehicle_id={due.vehicle_id}&service_id={service_id}')
+        assert f'<option value="{service_id}" selected>'.encode() in booking.data
+
+    def test_bulk_completion_matches_rebuild_and_interval_change(self, app, inspections, login):
+        service_id, order_ids = inspections
+        login("rec@terminy.pl").post('/reception/batch/status', data={"status": "Gotowe", "repair_ids": order_ids})
+        incremental = {(due.vehicle_id, due.next_due) for due in ServiceDue.query}
+        assert len(incremental) == 2
+
+        assert rebuild_service_due() == 2
+        db.session.commit()
+        assert {(due.vehicle_id, due.next_due) for due in ServiceDue.query} == incremental
+
+        owner = login("szef@terminy.pl")
+        owner.post(f'/owner/edit_service/{service_id}', data={"name": "Przegląd okresowy", "price": 150,
+                                                               "reminder_days": 180})
+        assert {due.next_due - due.last_done_at for due in ServiceDue.query} == {timedelta(days=180)}
+        owner.post(f'/owner/edit_service/{service_id}', data={"name": "Przegląd okresowy", "price": 150})
+        assert ServiceDue.query.count() == 0
+
+    @pytest.fixture
+    def earlier(self, inspections, login):
+        """Wcześniejszy przegląd pojazdu z pierwszego zlecenia; oba zlecenia z fixture są już zakończone."""
+        service_id, order_ids = inspections
+        vehicle_id = db.session.get(RepairOrder, order_ids[0]).vehicle_id
+        earlier = RepairOrder(vehicle_id=vehicle_id, description="Poprzedni przegląd", status="Gotowe",
+                              start_date=datetime(2026, 1, 5, 8), end_date=datetime(2026, 1, 5, 12))
+        earlier.add_service(db.session.get(Service, service_id))
+        db.session.add(earlier)
+        db.session.commit()
+        login("rec@terminy.pl").post('/reception/batch/status', data={"status": "Gotowe", "repair_ids": order_ids})
+        assert {due.last_repair_id for due in ServiceDue.query} == set(order_ids)
+        return earlier.id
+
+    @pytest.mark.parametrize("batch", [False, True])
+    def test_reopened_order_no_longer_sets_due_date(self, app, inspections, earlier, login, batch):
+        service_id, order_ids = inspections
+        reception = login("rec@terminy.pl")
+        if batch:
+            reception.post('/reception/batch/status', data={"status": "W trakcie naprawy", "repair_ids": order_ids})
+        else:
+            for order_id in order_ids:
+                reception.post(f'/repair/edit/{order_id}', data={"status": "W trakcie naprawy"})
+
+        due = ServiceDue.query.one()
+        assert (due.service_id, due.last_repair_id) == (service_id, earlier)
+        assert due.next_due == datetime(2026, 1, 5, 12) + timedelta(days=365)
+
+    @pytest.mark.parametrize("batch", [False, True])
+    def test_deleted_order_keeps_reminders_and_falls_back_to_history(self, app, inspections, earlier, login, batch):
+        service_id, order_ids = inspections
+        assert queue_due_reminders(now=datetime(2100, 1, 1)) == 2
+        reception = login("rec@terminy.pl")
+        if batch:
+            reception.post('/reception/batch/delete', data={"repair_ids": order_ids})
+        else:
+            for order_id in order_ids:
+                reception.post(f'/appointment/delete/{order_id}')
+
+        assert RepairOrder.query.count() == 1
+        due = ServiceDue.query.one()
+        assert (due.service_id, due.last_repair_id) == (service_id, earlier)
+        assert {(n.kind, n.repair_id) for n in Notification.query} == {("reminder", order_id) for order_id in order_ids}
+
+
+class TestAnalytics:
+    @pytest.fixture
+    def orders(self, make_user, make_order):
+        make_user("szef@analiza.pl", "owner")
+        anna = make_user("anna@analiza.pl", "mechanic", "Anna", "Nowak")
+        jan = make_user("jan@analiza.pl", "mechanic", "Jan", "Kos")
+        oil = Service(name="Wymiana oleju", base_price=200.0)
+        brakes = Service(name="Hamulce", base_price=400.0)
+        db.session.add_all([oil, brakes])
+        db.session.commit()
+        # (mechanik, marka, usługi, przyjęcie, godziny realizacji)
+        plan = [(anna, "Fiat", [oil], datetime(2026, 1, 5, 8), 4),
+                (anna, "Skoda", [oil, brakes], datetime(2026, 1, 20, 8), 10),
+                (jan, "Fiat", [brakes], datetime(2026, 2, 3, 8), 6)]
+        for i, (mechanic, make, services, start, hours) in enumerate(plan):
+            make_order(f"KR A{i}", make=make, model="X", status="Gotowe", mechanic_id=mechanic.id,
+                       start_date=start, end_date=start + timedelta(hours=hours), services=services)
+        make_order("KR A9", make="Opel", model="Y", description="W toku", status="W trakcie naprawy",
+                   mechanic_id=jan.id, services=[brakes])
+        db.session.commit()
+
+    def test_group_bys_over_finished_orders(self, app, orders):
+        report = summarize(build_snapshot())
+
+        assert (report["orders"], report["revenue"], report["avg_hours"]) == (3, 1200.0, 20 / 3)
+        assert [(r["label"], r["orders"], r["revenue"], r["hours"], r["avg_hours"]) for r in report["by_mechanic"]] \
+            == [("Anna Nowak", 2, 800.0, 14.0, 7.0), ("Jan Kos", 1, 400.0, 6.0, 6.0)]
+        assert {r["label"]: (r["orders"], r["revenue"], r["avg_hours"]) for r in report["by_service"]} \
+            == {"Hamulce": (2, 800.0, 8.0), "Wymiana oleju": (2, 400.0, 7.0)}
+        assert {r["label"]: r["revenue"] for r in report["by_model"]} == {"Fiat X": 600.0, "Skoda X": 600.0}
+        assert [(r["label"], r["orders"]) for r in report["trend"]] == [("2026-01", 2), ("2026-02", 1)]
+
+    def test_branch_snapshots_combine_by_label(self, app, orders):
+        first = build_snapshot()
+        mechanic = User(first_name="Ewa", last_name="Lis", email="ewa@analiza.pl", role="mechanic", password="x")
+        db.session.add(mechanic)
+        db.session.commit()
+        order = RepairOrder.query.filter_by(status="W trakcie naprawy").one()
+        order.status, order.mechanic_id, order.end_date = "Gotowe", mechanic.id, order.start_date + timedelta(hours=2)
+        db.session.commit()
+
+        report = summarize(combine([first, build_snapshot()]))
+        assert report["orders"] == 7
+        assert {r["label"]: r["orders"] for r in report["by_mechanic"]} == {"Anna Nowak": 4, "Jan Kos": 2,
+                                                                            "Ewa Lis": 1}
+        assert {r["label"]: r["revenue"] for r in report["by_service"]} == {"Hamulce": 2000.0,
+                                                                            "Wymiana oleju": 800.0}
+
+    def test_view_reads_snapshot_without_touching_orders(self, app, orders, login, count_queries, tmp_path):
+        app.config["ANALYTICS_DIR"] = str(tmp_path)
+        client = login("szef@analiza.pl")
+        assert client.get('/owner/analytics').status_code == 302
+
+        assert refresh_snapshot() == 3
+        with count_queries() as statements:
+            response = client.get('/owner/analytics')
+        assert response.status_code == 200
+        assert "Anna Nowak" in response.get_data(as_text=True)
+        assert not [sql for sql in statements if "repair_order" in sql or "repair_services" in sql]
+
+
+class TestBackup:
+    def _app(self, tmp_path):
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'warsztat.db'}",
+                          "BACKUP_DIR": str(tmp_path / "kopie"), "BACKUP_KEEP": 2})
+        with app.app_context():
+            db.session.add(Part(name="Filtr", price=45.0, stock_quantity=5))
+            db.session.commit()
+        return app
+
+    def test_backup_command_keeps_verified_copies_with_retention(self, tmp_path):
+        app = self._app(tmp_path)
+        runner = app.test_cli_runner()
+        for second in range(3):
+            with app.app_context():
+                backup_database(db.engine, tmp_path / "kopie", "warsztat", now=datetime(2026, 1, 1, 12, 0, second))
+        result = runner.invoke(args=["backup"])
+
+        assert result.exit_code == 0, result.output
+        copies = list_backups(tmp_path / "kopie", "warsztat")
+        assert len(copies) == 2 and copies[-1].name == "warsztat-20260101-120002.db"
+        assert not list((tmp_path / "kopie").glob("*.part"))
+
+    def test_restore_brings_back_data_and_refuses_broken_copy(self, tmp_path):
+        app = self._app(tmp_path)
+        with app.app_context():
+            copy = backup_database(db.engine, tmp_path / "kopie", "warsztat")
+            Part.query.delete()
+            db.session.commit()
+
+            broken = tmp_path / "zepsuta.db"
+            broken.write_bytes(copy.read_bytes()[:4096] + b"\0" * 4096)
+            with pytest.raises(BackupError):
+                restore_database(db.engine, broken, tmp_path / "kopie", "warsztat")
+            assert Part.query.count() == 0
+
+            safety = restore_database(db.engine, copy, tmp_path / "kopie", "warsztat")
+            db.session.remove()
+            assert Part.query.one().name == "Filtr"
+            assert safety.parent.name == "przed-przywroceniem"
+
+    def test_memory_database_cannot_be_backed_up(self, app, tmp_path):
+        with pytest.raises(BackupError):
+            backup_database(db.engine, tmp_path, "warsztat")
+        result = app.test_cli_runner().invoke(args=["backup"])
+        assert result.exit_code == 1 and "Error:" in result.output
+        assert not isinstance(result.exception, BackupError)
+
+    def test_retention_ignores_copies_of_branch_with_longer_prefix(self, tmp_path):
+        app = self._app(tmp_path)
+        kopie = tmp_path / "kopie"
+        with app.app_context():
+            other = backup_database(db.engine, kopie, "warsztat-nowa", now=datetime(2026, 1, 1, 11, 0, 0))
+            for second in range(3):
+                backup_database(db.engine, kopie, "warsztat", now=datetime(2026, 1, 1, 12, 0, second))
+
+        assert [copy.name for copy in list_backups(kopie, "warsztat")] == [
+            "warsztat-20260101-120002.db", "warsztat-20260101-120001.db", "warsztat-20260101-120000.db"]
+        prune_backups(kopie, "warsztat", 1)
+        assert other.exists() and len(list_backups(kopie, "warsztat")) == 1
+
 class TestValidators:
     def test_nip_validation_algorithm(self):
         assert validate_nip('123-456-32-18') is True, "Poprawny NIP z myślnikami powinien przejść"